@@ -0,0 +1,30 @@
+"""
+shared helpers for the offline benchmarks, run them from the repository root,
+eg. `python -m bench.ingest`
+"""
+import statistics
+import tempfile
+
+from libcord import LibCord
+from libcord.fakebridge import FakeMatterbridge
+
+
+def make_cord(bridge: FakeMatterbridge, **kwargs) -> LibCord:
+    """
+    a LibCord talking to the fake matterbridge, with its wiki in a local bare repository
+    """
+    kwargs.setdefault('wiki', {'offline': True, 'path': tempfile.mkdtemp(prefix='pycord-bench-') + '/wiki'})
+    return LibCord(username='bench', host=bridge.host, port=bridge.port, **kwargs)
+
+
+def percentile(values, p: float) -> float:
+    values = sorted(values)
+    if not values:
+        return float('nan')
+    k = min(int(round(p / 100 * (len(values) - 1))), len(values) - 1)
+    return values[k]
+
+
+def report(name: str, latencies, extra: str = ''):
+    ms = [l * 1000 for l in latencies]
+    print(f"{name:<24} n={len(ms):<6} mean={statistics.mean(ms):8.2f}ms p50={percentile(ms, 50):8.2f}ms p99={percentile(ms, 99):8.2f}ms {extra}")
@@ -0,0 +1,56 @@
+"""
+per call overhead of LibCord.call for prefix commands, with the compiled
+argument binder and with every call going through argparse
+
+    python -m bench.dispatch [--calls 20000]
+"""
+import argparse
+import logging
+import timeit
+
+from libcord.fakebridge import FakeMatterbridge
+from .common import make_cord
+
+CALLS = [
+    'd 5',
+    'd 5 something',
+    'd 5 something val2',
+    'test2 name 3 x',
+    'g "quoted search"',
+    'help d',
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='bench.dispatch')
+    parser.add_argument('--calls', type=int, default=20000)
+    args = parser.parse_args()
+    logging.getLogger('libcord').setLevel(logging.ERROR)
+
+    with FakeMatterbridge() as bridge:
+        cord = make_cord(bridge)
+    cord.loader.load_all()
+    commands = cord.registry.unique()
+    binders = {name: cmd.binder for name, cmd in commands.items()}
+    print(f"{sum(1 for binder in binders.values() if binder)} of {len(binders)} commands bound without argparse")
+
+    def run(text_list):
+        for text in text_list:
+            cord.call(text)
+
+    texts = (CALLS * (args.calls // len(CALLS) + 1))[:args.calls]
+    fast = {text: cord.call(text).output for text in CALLS}
+    fast_time = timeit.timeit(lambda: run(texts), number=1)
+
+    for cmd in commands.values():
+        cmd.binder = None
+    slow = {text: cord.call(text).output for text in CALLS}
+    slow_time = timeit.timeit(lambda: run(texts), number=1)
+
+    assert fast == slow, (fast, slow)
+    print(f"{'argparse':<24} {slow_time / len(texts) * 1e6:8.2f}us/call")
+    print(f"{'binder':<24} {fast_time / len(texts) * 1e6:8.2f}us/call ({slow_time / fast_time:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+compares poll and stream ingest: latency from a message reaching the fake
+matterbridge until it is on LibCord.q, and requests sent while idle
+
+    python -m bench.ingest [--messages 200] [--interval 0.01] [--idle 2]
+"""
+import argparse
+import asyncio
+import time
+
+from libcord.fakebridge import FakeMatterbridge
+from .common import make_cord, report
+
+
+async def measure(cord, bridge: FakeMatterbridge, messages: int, interval: float, idle: float):
+    producer = asyncio.ensure_future(cord.produce_message())
+    await asyncio.sleep(0.5)
+
+    polls_before = bridge.requests.get('/api/messages', 0)
+    await asyncio.sleep(idle)
+    idle_requests = bridge.requests.get('/api/messages', 0) - polls_before
+
+    latencies = []
+
+    async def consume():
+        while len(latencies) < messages:
+            message = await cord.q.get()
+            latencies.append(time.perf_counter() - float(message.text))
+
+    consumer = asyncio.ensure_future(consume())
+    for _ in range(messages):
+        bridge.inject(repr(time.perf_counter()))
+        await asyncio.sleep(interval)
+    await asyncio.wait_for(consumer, timeout=5)
+
+    producer.cancel()
+    await asyncio.gather(producer, return_exceptions=True)
+    await cord.transport.close()
+    return latencies, idle_requests
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='bench.ingest')
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--interval', type=float, default=0.01)
+    parser.add_argument('--idle', type=float, default=2.0)
+    args = parser.parse_args()
+
+    for mode in ('poll', 'stream'):
+        with FakeMatterbridge() as bridge:
+            cord = make_cord(bridge, ingest=mode)
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            latencies, idle_requests = loop.run_until_complete(
+                measure(cord, bridge, args.messages, args.interval, args.idle))
+            loop.close()
+            report(mode, latencies, f"idle requests/s={idle_requests / args.idle:.1f}")
+
+
+if __name__ == '__main__':
+    main()
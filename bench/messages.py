@@ -0,0 +1,92 @@
+"""
+decoding /api/messages responses: json plus Message(**dict) with the previous
+plain class against decode_messages with the slotted Message
+
+    python -m bench.messages [--batch 1000] [--batches 50] [--users 200] [--gateways 10]
+"""
+import argparse
+import json
+import random
+import timeit
+import tracemalloc
+
+from libcord.message import Message, decode_messages
+
+
+class PlainMessage(object):
+    """
+    the message class before it got __slots__
+    """
+    def __init__(self, text: str, channel: str = None, username: str = None, avatar: str = None, account: str = None, event: str = None, protocol: str = None, gateway: str = None, timestamp: str = None):
+        self.text = text
+        self.channel = channel
+        self.username = username
+        self.avatar = avatar
+        self.account = account
+        self.event = event
+        self.protocol = protocol
+        self.gateway = gateway
+        self.timestamp = timestamp
+
+
+def plain_decode(body: bytes):
+    return [PlainMessage(**message_dict) for message_dict in json.loads(body)]
+
+
+def make_body(size: int, users: int, gateways: int, seed: int = 0) -> bytes:
+    rng = random.Random(seed)
+    messages = []
+    for i in range(size):
+        user = rng.randrange(users)
+        messages.append({
+            'text': f"message {i} " + 'x' * rng.randrange(80),
+            'channel': f"channel{user % 7}",
+            'username': f"user{user}",
+            'avatar': f"https://cdn.discordapp.com/avatars/{user:018d}/{user * 7919:032x}.jpg",
+            'account': f"discord.server{user % 3}",
+            'event': '',
+            'protocol': 'discord',
+            'gateway': f"gateway{rng.randrange(gateways)}",
+            'timestamp': '2017-06-06T22:26:08.759413856+02:00',
+        })
+    return json.dumps(messages).encode()
+
+
+def held_memory(decode, bodies) -> int:
+    """
+    bytes still allocated while the decoded messages of all bodies are kept
+    """
+    tracemalloc.start()
+    kept = [decode(body) for body in bodies]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='bench.messages')
+    parser.add_argument('--batch', type=int, default=1000)
+    parser.add_argument('--batches', type=int, default=50)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--gateways', type=int, default=10)
+    args = parser.parse_args()
+
+    bodies = [make_body(args.batch, args.users, args.gateways, seed) for seed in range(args.batches)]
+    total = args.batch * args.batches
+    assert [message.as_dict() for message in decode_messages(bodies[0])] == [
+        {key: value for key, value in vars(message).items() if value} for message in plain_decode(bodies[0])]
+
+    print(f"{args.batches} batches of {args.batch} messages, {args.users} users over {args.gateways} gateways")
+    results = {}
+    for name, decode in (('plain Message(**dict)', plain_decode), ('decode_messages', decode_messages)):
+        elapsed = min(timeit.repeat(lambda: [decode(body) for body in bodies], number=1, repeat=3))
+        memory = held_memory(decode, bodies)
+        results[name] = (elapsed, memory)
+        print(f"{name:<24} {total / elapsed:10.0f} messages/s {memory / total:8.0f} bytes/message")
+    (plain_time, plain_memory), (fast_time, fast_memory) = results.values()
+    print(f"{'':<24} {plain_time / fast_time:9.2f}x faster {1 - fast_memory / plain_memory:8.0%} less memory")
+
+
+if __name__ == '__main__':
+    main()
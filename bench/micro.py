@@ -0,0 +1,58 @@
+"""
+per call cost of the hot paths behind every message: LibCord.call,
+LibCord.call_regex and Authenticator.identify
+
+    python -m bench.micro [--number 20000]
+"""
+import argparse
+import logging
+import timeit
+
+from libcord.authenticator import Authenticator
+from libcord.fakebridge import FakeMatterbridge
+from .common import make_cord
+from .throughput import ACCOUNT, make_auth
+
+CASES = {
+    'call': [
+        ('d', 'd 5'),
+        ('d quoted', 'd 5 "some thing"'),
+        ('unknown', 'nosuchcommand 1'),
+    ],
+    'call_regex': [
+        ('match', '3dd6'),
+        ('no match', 'just chatting, nothing to see'),
+    ],
+}
+
+
+def timed(name: str, func, number: int):
+    elapsed = timeit.timeit(func, number=number)
+    print(f"{name:<32} {elapsed / number * 1e6:8.2f}us/call")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='bench.micro')
+    parser.add_argument('--number', type=int, default=20000)
+    args = parser.parse_args()
+    logging.getLogger('libcord').setLevel(logging.CRITICAL)
+
+    with FakeMatterbridge() as bridge:
+        cord = make_cord(bridge)
+    cord.loader.load_all()
+
+    for method, cases in CASES.items():
+        func = getattr(cord, method)
+        for name, text in cases:
+            timed(f"{method} {name}", lambda: func(text), args.number)
+
+    auth = Authenticator(send=lambda message: None, **make_auth(50))
+    timed('identify username', lambda: auth.identify('user7', ACCOUNT), args.number)
+    timed('identify nickname', lambda: auth.identify('nick7', ACCOUNT), args.number)
+    timed('identify unknown', lambda: auth.identify('stranger', ACCOUNT), args.number)
+    timed('identify unknown account', lambda: auth.identify('user7', 'other.account'), args.number)
+    print(f"{'identify cache':<32} {auth.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+compares the compiled regex dispatcher in call_regex with the former linear
+scan over every regex command, on a mix of chat noise, commands and triggers
+
+    python -m bench.regex [--patterns 50] [--messages 20000]
+"""
+import argparse
+import random
+import timeit
+
+from libcord import CommandContext
+from libcord.fakebridge import FakeMatterbridge
+from .common import make_cord
+
+NOISE = [
+    "hey, anyone around?",
+    "i think the build is broken again",
+    "lol",
+    "did you see the new release notes",
+    "brb",
+    "that pull request still needs a review",
+    "what time is the meeting tomorrow",
+]
+
+
+def register_patterns(cord, count: int):
+    handler = cord.create_handler('bench')
+    for i in range(count):
+        kind = i % 3
+        if kind == 0:
+            pattern = rf'!issue{i} #(?P<number>\d+)'
+        elif kind == 1:
+            pattern = rf'(?P<count>\d+)x{i}(?P<sides>\d+)'
+        else:
+            pattern = rf'(?P<word>\w+)\+\+{i}'
+
+        def func(text: str, **groups):
+            return text
+        handler.regex(pattern)(func)
+        handler.register(f"pattern{i}")(func)
+
+
+def linear_scan(cord, text: str, context: CommandContext):
+    results = []
+    for handler_name, cmd_handler in cord.cmd_handlers.items():
+        for prog, cmd in cmd_handler.cmd_map.items():
+            if cmd.regex_func:
+                result = cmd.regex_func(text=text, context=context, user=None)
+                if result:
+                    result.cmd = prog
+                    results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='bench.regex')
+    parser.add_argument('--patterns', type=int, default=50)
+    parser.add_argument('--messages', type=int, default=20000)
+    args = parser.parse_args()
+
+    with FakeMatterbridge() as bridge:
+        cord = make_cord(bridge)
+    cord.loader.load_all()
+    register_patterns(cord, args.patterns)
+    cord.build_regex_dispatch()
+
+    rng = random.Random(42)
+    texts = []
+    for _ in range(args.messages):
+        roll = rng.random()
+        if roll < 0.8:
+            texts.append(rng.choice(NOISE))
+        elif roll < 0.9:
+            texts.append(f".test2 name {rng.randint(1, 9)} x")
+        else:
+            texts.append(f"{rng.randint(1, 9)}dd{rng.randint(1, 20)}")
+    context = CommandContext.NONE
+
+    for text in set(texts):
+        old = sorted(result.cmd for result in linear_scan(cord, text, context))
+        new = sorted(result.cmd for result in cord.call_regex(text=text, context=context))
+        assert old == new, (text, old, new)
+
+    linear = timeit.timeit(lambda: [linear_scan(cord, text, context) for text in texts], number=1)
+    dispatch = timeit.timeit(lambda: [cord.call_regex(text=text, context=context) for text in texts], number=1)
+    regex_commands = len(cord.regex_dispatcher.entries)
+    print(f"{regex_commands} regex commands, {len(texts)} messages")
+    print(f"{'linear scan':<24} {linear / len(texts) * 1e6:8.2f}us/message")
+    print(f"{'compiled dispatch':<24} {dispatch / len(texts) * 1e6:8.2f}us/message ({linear / dispatch:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
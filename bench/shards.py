@@ -0,0 +1,98 @@
+"""
+cpu bound commands in one process against the sharded mode with several worker
+processes, the dice regex command with big rolls keeps a core busy per message
+
+    python -m bench.shards [--messages 400] [--workers 4] [--rolls 20000] [--gateways 16]
+"""
+import argparse
+import asyncio
+import logging
+import tempfile
+import time
+
+from libcord import LibCord
+from libcord.fakebridge import FakeMatterbridge
+from libcord.shard import ShardSupervisor
+
+
+def inject(bridge: FakeMatterbridge, messages: int, rolls: int, gateways: int):
+    for i in range(messages):
+        bridge.inject(text=f"{rolls}dd6", gateway=f"gateway{i % gateways}", username=f"user{i % 50}")
+
+
+async def wait_replies(bridge: FakeMatterbridge, expected: int, timeout: float) -> float:
+    start = time.perf_counter()
+    deadline = start + timeout
+    while len(bridge.sent) < expected and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+    return (bridge.sent_at[-1] if bridge.sent_at else time.perf_counter()) - start
+
+
+def config(bridge: FakeMatterbridge, messages: int) -> dict:
+    return {
+        'username': 'bench', 'host': bridge.host, 'port': bridge.port, 'ingest': 'stream',
+        'store': {'backend': 'local', 'path': tempfile.mkdtemp(prefix='pycord-bench-')},
+        'outbound': {'rate': 0, 'coalesce': False, 'max_queue': messages},
+        'queue': {'maxsize': messages}, 'log_level': 'ERROR',
+    }
+
+
+def single(args) -> (int, float):
+    with FakeMatterbridge(buffer=args.messages) as bridge:
+        settings = config(bridge, args.messages)
+        cord = LibCord(**{key: value for key, value in settings.items() if key != 'log_level'})
+        cord.loader.load_all()
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        tasks = [loop.create_task(cord.produce_message()), loop.create_task(cord.consume_message())]
+        loop.run_until_complete(asyncio.sleep(0.5))
+        inject(bridge, args.messages, args.rolls, args.gateways)
+        elapsed = loop.run_until_complete(wait_replies(bridge, args.messages, args.timeout))
+        for task in tasks:
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        loop.run_until_complete(cord.transport.close())
+        loop.close()
+        return len(bridge.sent), elapsed
+
+
+def sharded(args) -> (int, float):
+    with FakeMatterbridge(buffer=args.messages) as bridge:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        supervisor = ShardSupervisor(config(bridge, args.messages), workers=args.workers)
+        supervisor.run()
+        # wait until every worker has imported the modules and sent its first heartbeat
+        while not all(shard.beat > shard.started for shard in supervisor.shards):
+            loop.run_until_complete(asyncio.sleep(0.1))
+        inject(bridge, args.messages, args.rolls, args.gateways)
+        elapsed = loop.run_until_complete(wait_replies(bridge, args.messages, args.timeout))
+        supervisor.stop()
+        loop.run_until_complete(asyncio.gather(*supervisor.tasks, return_exceptions=True))
+        loop.run_until_complete(supervisor.cord.transport.close())
+        loop.close()
+        return len(bridge.sent), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='bench.shards')
+    parser.add_argument('--messages', type=int, default=400)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rolls', type=int, default=20000)
+    parser.add_argument('--gateways', type=int, default=16)
+    parser.add_argument('--timeout', type=float, default=120.0)
+    args = parser.parse_args()
+    logging.getLogger('libcord').setLevel(logging.ERROR)
+
+    print(f"{args.messages} messages '{args.rolls}dd6' over {args.gateways} gateways")
+    results = {}
+    for name, run in (('one process', single), (f"{args.workers} workers", sharded)):
+        replies, elapsed = run(args)
+        results[name] = elapsed
+        print(f"{name:<24} {replies:6} replies {args.messages / elapsed:8.1f} messages/s")
+    single_time, sharded_time = results.values()
+    print(f"{'':<24} {single_time / sharded_time:13.2f}x")
+
+
+if __name__ == '__main__':
+    main()
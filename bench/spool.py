@@ -0,0 +1,70 @@
+"""
+cost of the message spool: appending with batched fsyncs against an fsync per message,
+and the time to recover the unhandled tail of a log on start
+
+    python -m bench.spool [--messages 20000] [--outstanding 1000] [--interval 0.05]
+"""
+import argparse
+import json
+import os
+from pathlib import Path
+import tempfile
+import time
+
+from libcord.message import decode_messages
+from libcord.spool import MessageSpool
+from .messages import make_body
+
+
+def fsync_each(messages) -> float:
+    """
+    what appending without batching costs, one write and fsync per message
+    """
+    path = Path(tempfile.mkdtemp(prefix='pycord-bench-spool-'), 'messages.log')
+    start = time.perf_counter()
+    with open(path, 'ab') as f:
+        for seq, message in enumerate(messages):
+            f.write((json.dumps({'seq': seq, 'message': message.as_dict()}, separators=(',', ':')) + '\n').encode())
+            f.flush()
+            os.fsync(f.fileno())
+    return time.perf_counter() - start
+
+
+def batched(messages, interval: float) -> (float, MessageSpool):
+    spool = MessageSpool(tempfile.mkdtemp(prefix='pycord-bench-spool-'), fsync_interval=interval, compact_size=1 << 40)
+    start = time.perf_counter()
+    for message in messages:
+        spool.append(message)
+    spool.close()
+    return time.perf_counter() - start, spool
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='bench.spool')
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--outstanding', type=int, default=1000)
+    parser.add_argument('--interval', type=float, default=0.05)
+    args = parser.parse_args()
+
+    messages = decode_messages(make_body(args.messages, users=200, gateways=10))
+    print(f"{args.messages} messages")
+    each = fsync_each(messages[:min(len(messages), 2000)]) / min(len(messages), 2000)
+    print(f"{'fsync per message':<24} {1 / each:10.0f} messages/s")
+    elapsed, spool = batched(messages, args.interval)
+    print(f"{'batched fsync':<24} {len(messages) / elapsed:10.0f} messages/s {spool.syncs} fsyncs ({each * len(messages) / elapsed:.0f}x)")
+
+    # a log in which all but the last `outstanding` messages were handled
+    spool = MessageSpool(spool.directory, compact_size=1 << 40)
+    for message in spool.recovered[:len(spool.recovered) - args.outstanding]:
+        spool.done(message)
+    spool.close()
+    size = spool.path.stat().st_size
+    start = time.perf_counter()
+    spool = MessageSpool(spool.directory, compact_size=1 << 40)
+    elapsed = time.perf_counter() - start
+    spool.close()
+    print(f"{'recovery':<24} {len(spool.recovered)} unhandled of {args.messages} in {elapsed * 1000:.1f}ms, log compacted from {size} to {spool.path.stat().st_size} bytes")
+
+
+if __name__ == '__main__':
+    main()
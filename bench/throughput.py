@@ -0,0 +1,140 @@
+"""
+end to end throughput: synthetic chat traffic is injected into the fake matterbridge,
+LibCord handles it like in production and the replies posted back are timed
+
+    python -m bench.throughput [--messages 2000] [--rate 0] [--gateways 16]
+                               [--mix command=4,regex=2,noise=10,multiline=1]
+                               [--ingest stream] [--transport aiohttp] [--latency 0]
+
+--rate is the number of injected messages per second, 0 injects them all at once
+"""
+import argparse
+import asyncio
+from collections import deque
+import logging
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Deque, Dict, List, Tuple
+
+import yaml
+
+from libcord.fakebridge import FakeMatterbridge
+from .common import make_cord, percentile, report
+
+ACCOUNT = 'bench.test'
+
+# message kind: (text, whether LibCord answers it)
+TRAFFIC = {
+    'command': (lambda i: f".d {i} something", True),
+    'regex': (lambda i: f"{i % 9 + 1}dd6", True),
+    'noise': (lambda i: f"just chatting, message {i}", False),
+    'multiline': (lambda i: f".m {i % 5 + 2}", True),
+}
+
+
+def parse_mix(text: str) -> Dict[str, int]:
+    mix = {}
+    for part in text.split(','):
+        kind, _, weight = part.partition('=')
+        if kind not in TRAFFIC:
+            raise argparse.ArgumentTypeError(f"unknown traffic kind '{kind}', choose from {list(TRAFFIC)}")
+        mix[kind] = int(weight or 1)
+    return mix
+
+
+def make_auth(users: int) -> dict:
+    """
+    an auth directory with one account file, every bench user is known
+    """
+    directory = tempfile.mkdtemp(prefix='pycord-bench-auth-')
+    data = {'users': {i: {'username': f"user{i}", 'nickname': f"nick{i}"} for i in range(users)}}
+    Path(directory, f"{ACCOUNT}.txt").write_text(yaml.safe_dump(data))
+    return {'directory': directory}
+
+
+def traffic(messages: int, mix: Dict[str, int], gateways: int, seed: int = 0) -> List[Tuple[dict, bool]]:
+    rng = random.Random(seed)
+    kinds = rng.choices(list(mix), weights=list(mix.values()), k=messages)
+    result = []
+    for i, kind in enumerate(kinds):
+        text, answered = TRAFFIC[kind]
+        message = {'text': text(i), 'gateway': f"gateway{i % gateways}", 'username': f"user{i % 50}", 'account': ACCOUNT}
+        result.append((message, answered))
+    return result
+
+
+async def measure(cord, bridge: FakeMatterbridge, messages: List[Tuple[dict, bool]], rate: float, timeout: float):
+    producer = asyncio.ensure_future(cord.produce_message())
+    consumer = asyncio.ensure_future(cord.consume_message())
+    await asyncio.sleep(0.5)
+
+    # replies of one gateway come back in order, so they match up with the injected messages in order
+    pending: Dict[str, Deque[float]] = {}
+    expected = sum(1 for message, answered in messages if answered)
+    start = time.perf_counter()
+    for i, (message, answered) in enumerate(messages):
+        if rate:
+            delay = start + i / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        if answered:
+            pending.setdefault(message['gateway'], deque()).append(time.perf_counter())
+        bridge.inject(**message)
+
+    deadline = time.perf_counter() + timeout
+    while len(bridge.sent) < expected and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+    end = time.perf_counter()
+
+    latencies = []
+    for reply, sent_at in zip(bridge.sent, bridge.sent_at):
+        queue = pending.get(reply.get('gateway'))
+        if queue:
+            latencies.append(sent_at - queue.popleft())
+    if bridge.sent_at:
+        end = bridge.sent_at[-1]
+
+    for task in (producer, consumer):
+        task.cancel()
+    await asyncio.gather(producer, consumer, return_exceptions=True)
+    await cord.transport.close()
+    return latencies, expected, end - start
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='bench.throughput')
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--rate', type=float, default=0)
+    parser.add_argument('--gateways', type=int, default=16)
+    parser.add_argument('--mix', type=parse_mix, default='command=4,regex=2,noise=10,multiline=1')
+    parser.add_argument('--ingest', choices=['poll', 'stream'], default='stream')
+    parser.add_argument('--transport', choices=['requests', 'aiohttp'], default=None)
+    parser.add_argument('--latency', type=float, default=0.0, help="simulated seconds per matterbridge request")
+    parser.add_argument('--timeout', type=float, default=60.0)
+    args = parser.parse_args()
+    logging.getLogger('libcord').setLevel(logging.ERROR)
+
+    messages = traffic(args.messages, args.mix, args.gateways)
+    with FakeMatterbridge(latency=args.latency, buffer=max(1000, args.messages)) as bridge:
+        cord = make_cord(bridge, ingest=args.ingest, http={'transport': args.transport}, auth=make_auth(50),
+                         outbound={'rate': 0, 'coalesce': False, 'max_queue': args.messages},
+                         queue={'maxsize': args.messages})
+        cord.loader.load_all()
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        latencies, expected, elapsed = loop.run_until_complete(measure(cord, bridge, messages, args.rate, args.timeout))
+        loop.close()
+
+    mix = ", ".join(f"{kind}={weight}" for kind, weight in args.mix.items())
+    print(f"{args.messages} messages ({mix}) over {args.gateways} gateways, {args.ingest} ingest, {cord.transport.name} transport")
+    if len(latencies) < expected:
+        print(f"only {len(latencies)} of {expected} replies arrived within {args.timeout}s")
+    print(f"{'throughput':<24} {args.messages / elapsed:8.0f} messages/s, {len(latencies) / elapsed:.0f} replies/s")
+    if latencies:
+        report('reply latency', latencies, f"max={percentile(latencies, 100) * 1000:.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
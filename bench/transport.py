@@ -0,0 +1,53 @@
+"""
+compares the requests and aiohttp transports against the fake matterbridge:
+sequential GET /api/messages round trips and a burst of sends to many gateways
+
+    python -m bench.transport [--requests 200] [--sends 200] [--gateways 20] [--latency 0.01]
+"""
+import argparse
+import asyncio
+import time
+
+from libcord import Message
+from libcord.fakebridge import FakeMatterbridge
+from .common import make_cord, report
+
+
+async def measure(cord, bridge: FakeMatterbridge, requests: int, sends: int, gateways: int):
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        await cord.transport.get_messages()
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    tasks = [cord.send(Message(text=f"reply {i}", gateway=f"gateway{i % gateways}")) for i in range(sends)]
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    await cord.transport.close()
+    return latencies, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='bench.transport')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--sends', type=int, default=200)
+    parser.add_argument('--gateways', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.01)
+    args = parser.parse_args()
+
+    for transport in ('requests', 'aiohttp'):
+        with FakeMatterbridge(latency=args.latency) as bridge:
+            cord = make_cord(bridge, http={'transport': transport}, outbound={'rate': 0, 'coalesce': False})
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            latencies, elapsed = loop.run_until_complete(
+                measure(cord, bridge, args.requests, args.sends, args.gateways))
+            loop.close()
+            assert len(bridge.sent) == args.sends
+            report(f"{transport} get", latencies)
+            print(f"{transport + ' send':<24} {args.sends} sends in {elapsed:.3f}s = {args.sends / elapsed:.0f}/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,27 +1,49 @@
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from collections import namedtuple
-from typing import Dict, Callable, Any, Iterable, List
+from typing import Dict, Callable, Any, Awaitable, Iterable, List
+from contextlib import contextmanager
 import argparse
 from collections import OrderedDict
 from enum import Enum
 import inspect
+import itertools
 import logging
 from io import StringIO
 import json
-import requests
-import requests.exceptions
 import shlex
 import sys
-from time import sleep
+from time import sleep, perf_counter
 import traceback
-import yaml
 import copy
 import re
-from re import _pattern_type
+import zlib
+
+_pattern_type = type(re.compile(''))
+# text without quotes or escapes splits the same with str.split as with shlex
+_shlex_special = re.compile(r'[\'"\\]')
+_shlex_whitespace = re.compile(r'[ \t\r\n]+')
+# numbers the LibCord instances of a process, their gauges are labelled with it
+_instances = itertools.count()
 
 from .message import Message
 from .gitwiki import Gitwiki
+from .store import OutputStore, LocalStore
 from .authenticator import Authenticator, AuthUser
+from .stream import MatterbridgeStream
+from .transport import Transport, create_transport
+from .outbound import Outbox
+from .ratelimit import RateLimiter
+from .ingest import IngestQueue
+from .capture import TrafficCapture
+from .spool import MessageSpool
+from .tracing import Tracer, current_trace
+from .dispatch import RegexDispatcher, RegexEntry
+from .registry import CommandRegistry
+from .binding import ArgumentBinder
+from .cache import ResultCache, _missing
+from .execution import CommandJob, CommandTimeout, CommandCancelled, capture_output, current_output
+from .metrics import metrics as _metrics, stage_seconds, command_seconds, commands_total, messages_total, limited_total
 
 module_logger = logging.getLogger('libcord.core')
 
@@ -32,7 +54,7 @@ class CommandContext(object):
     NONE = None
 
     def __repr__(self):
-        return yaml.dump(self, default_flow_style=False)
+        return f"CommandContext(message={self.message!r})"
 
 
 CommandContext.NONE = CommandContext(message = None)
@@ -46,38 +68,54 @@ class CommandResult(object):
     NONE = None
 
     def __repr__(self):
-        return yaml.dump(self, default_flow_style=False)
+        return f"CommandResult(cmd={self.cmd!r}, is_help={self.is_help!r}, output={self.output!r})"
 
 class ResultType(Enum):
     DEFAULT = 0
     HELP = 1
 
 class Command(object):
-    def __init__(self, func: Callable[[Any], Any] = None, parser: argparse.ArgumentParser = None, regex_func: Callable[[Any], Any] = None):
+    def __init__(self, func: Callable[[Any], Any] = None, parser: argparse.ArgumentParser = None, regex_func: Callable[[Any], Any] = None, timeout: float = None, pattern: _pattern_type = None, prog: str = None, aliases: List[str] = (), binder: ArgumentBinder = None, limit=None, cache: ResultCache = None, coro: Callable[..., Awaitable[Any]] = None, regex_coro: Callable[..., Awaitable[Any]] = None):
+        self.prog = prog
+        # coroutine variants of func and regex_func, set for async def commands
+        self.coro = coro
+        self.regex_coro = regex_coro
+        self.limit = limit
+        self.cache = cache
+        self.binder = binder
+        self.aliases = list(aliases)
         self.func = func
         self.parser = parser
         self.regex_func = regex_func
+        self.timeout = timeout
+        self.pattern = pattern
     NONE = None
 
     def __repr__(self):
-        return yaml.dump(self, default_flow_style=False)
+        return f"Command(prog={self.prog!r}, aliases={self.aliases!r}, timeout={self.timeout!r}, pattern={self.pattern!r})"
     
     def description(self):
         return self.parser.description
 
 class CommandHandler:
-    def __init__(self, name: str):
+    def __init__(self, name: str, registry: CommandRegistry = None):
         self.name = name #TODO: use for printing
+        self.registry = registry
         self.cmd_map = dict()
         self.func_arg_map = {}
         self.func_context_map = {}
         self.func_user_map = {}
         self.func_text_map = {}
         self.func_pattern_map = {}
+        self.func_cache_map = {}
 
-    def register(self, prog: str, description: str = None, regex=None):
+    def register(self, prog: str, description: str = None, regex=None, timeout: float = None, aliases: List[str] = (), limit=None):
         """
-        registers a function as a given command name, with a optional description
+        registers a function as a given command name and aliases, with a optional description,
+        a time limit in seconds that replaces the default command_timeout and a rate limit,
+        either the name of a class from the ratelimit config or (rate, burst) per user,
+        `async def` functions and async generators are awaited on the event loop instead of
+        running on the command pool, a generator's output is every line it yields
         """
         def func_wrapper(func):
             argspec: inspect.FullArgSpec = inspect.getfullargspec(func)
@@ -119,6 +157,7 @@ class CommandHandler:
                     self.func_text_map[func] = command_text = False
 
             command_pattern = self.func_pattern_map.get(func)
+            result_cache: ResultCache = self.func_cache_map.get(func)
 
             defaults = {}
             if argspec.defaults:
@@ -126,6 +165,9 @@ class CommandHandler:
                     module_logger.debug(f"argument={arg} default={default_value}")
                     defaults[arg] = default_value
 
+            # everything added to the parser, to compile the fast binder from
+            added_arguments = []
+
             def add_argument(argument: str, data: dict):
                 if dest == command_context:
                     module_logger.info('context does not generate arguments')
@@ -174,6 +216,7 @@ class CommandHandler:
                         filtered_names.append('-'+data['short'])
                 module_logger.debug(f"names: {filtered_names} data: {filtered_data}")
                 parser.add_argument(*filtered_names, **filtered_data)
+                added_arguments.append((arg_type, filtered_names, filtered_data))
 
             for dest, data in reversed(arg_dict.items()):
                 add_argument(argument=dest, data=data)
@@ -188,157 +231,278 @@ class CommandHandler:
                 module_logger.debug(f"generating default argument for non decorated argument: {dest}")
                 add_argument(argument=dest, data=data)
                 
-            '''
-            splits args and executes method, handles capturing output
-            '''
-            def execute(*args: str, text: str, context: CommandContext = None, user: AuthUser = None) -> CommandResult:
-                module_logger.debug(f"\ncalling: {parser.prog}")
-                module_logger.debug(f"args: {args}")
-
-                self.prints_help = False
-
-                def fake_exit(status=0, message=None):
-                    """Prevents arparse from killing the program"""
-                    if message:
-                        module_logger.error(f"status: {status} message: {message}")
-                        # if status != 2: # not sure if this is good, prevents printing on --help hopefully
-                        if not self.prints_help:
-                            print(message)
-                        module_logger.warning("exit aborted")
-                    return
-                parser.exit = fake_exit
-
-                old_help = parser.print_help
-                def help_wrapper(file=None):
-                    self.prints_help = True
-                    old_help(file=file)
-
-                parser.print_help = help_wrapper
-
-                old_stdout = sys.stdout
+            def fake_exit(status=0, message=None):
+                """Prevents arparse from killing the program"""
+                if message:
+                    module_logger.error(f"status: {status} message: {message}")
+                    # if status != 2: # not sure if this is good, prevents printing on --help hopefully
+                    output = current_output()
+                    if not (output and output.is_help):
+                        print(message)
+                    module_logger.warning("exit aborted")
+                return
+            parser.exit = fake_exit
+
+            parser_help = parser.print_help
+            def help_wrapper(file=None):
+                output = current_output()
+                if output is not None:
+                    output.is_help = True
+                parser_help(file=file)
+
+            parser.print_help = help_wrapper
+
+            is_coroutine = inspect.iscoroutinefunction(func)
+            is_generator = inspect.isasyncgenfunction(func)
+
+            def parse(args: tuple) -> (dict, str):
+                """
+                bound arguments of a call, or the usage and errors printed by the parser instead
+                """
+                arguments: dict = cmd.binder.bind(args) if cmd.binder else None
+                if arguments is not None:
+                    return arguments, ""
+                arguments = {}
+                with capture_output() as mystdout:
+                    try:
+                        namespace = parser.parse_args(args=args)
+                        arguments: dict = vars(namespace)
+                    except TypeError as typerr:
+                        module_logger.exception("type error during parsing of arguments")
+                        print(traceback.format_exc())
+                        # print(type(typerr))
+                        # print(typerr)
 
-                arguments: dict = {}
+                    except Exception as ex:
+                        module_logger.exception("exception during parsing of arguments")
+                        print(traceback.format_exc())
 
-                try:
-                    sys.stdout = mystdout = StringIO()
+                return arguments, mystdout.getvalue().rstrip()
+
+            def cached(arguments: dict, user: AuthUser, text: str = None) -> (Any, CommandResult):
+                """
+                cache key of a call and its cached result, both None if the command does not cache
+                """
+                result_cache = cmd.cache
+                if not result_cache:
+                    return None, None
+                cache_key = result_cache.key(arguments, user if result_cache.per_user else None, text)
+                if cache_key is None:
+                    return None, None
+                result = result_cache.get(cache_key)
+                if result is _missing:
+                    return cache_key, None
+                return cache_key, CommandResult(output=result.output, is_help=result.is_help)
+
+            def complete(arguments: dict, text: str, context: CommandContext, user: AuthUser):
+                if command_context:
+                    arguments[command_context] = context
+
+                if command_user:
+                    arguments[command_user] = user
+
+                if command_text:
+                    arguments[command_text] = text
+
+            def returned(ret) -> bool:
+                """
+                prints a returned string, True if the function returned ResultType.HELP
+                """
+                if type(ret) is str:
+                    print(ret)
+                elif type(ret) is ResultType:
+                    if ret == ResultType.HELP:
+                        return True
+                # TODO check if it is HELP
+                return False
+
+            def run(arguments: dict, debug: bool) -> (CommandResult, bool):
+                is_help = False
+                failed = False
+                with capture_output() as mystdout:
+                    try:
+                        if debug:
+                            module_logger.debug(f"arguments: {arguments}")
+                        is_help = returned(func(**arguments))
+                    except CommandCancelled:
+                        raise
+                    except Exception as ex:
+                        failed = True
+                        module_logger.exception("exception executing function")
+                        print(traceback.format_exc())
+                output = mystdout.getvalue().rstrip()
+                if debug:
+                    module_logger.debug(f"command output: {output}")
+                return CommandResult(output=output, is_help=is_help), failed
 
-                    namespace = parser.parse_args(args=args)
-                    arguments: dict = vars(namespace)
-                except TypeError as typerr:
-                    module_logger.exception("type error during parsing of arguments")
-                    print(traceback.format_exc())
-                    # print(type(typerr))
-                    # print(typerr)
+            async def run_async(arguments: dict, debug: bool) -> (CommandResult, bool):
+                """
+                awaits an async function, its output is what it prints and returns,
+                or every line an async generator yields
+                """
+                is_help = False
+                failed = False
+                with capture_output() as mystdout:
+                    try:
+                        if debug:
+                            module_logger.debug(f"arguments: {arguments}")
+                        if is_generator:
+                            async for line in func(**arguments):
+                                is_help = returned(line) or is_help
+                        else:
+                            is_help = returned(await func(**arguments))
+                    except CommandCancelled:
+                        raise
+                    except Exception as ex:
+                        failed = True
+                        module_logger.exception("exception executing function")
+                        print(traceback.format_exc())
+                output = mystdout.getvalue().rstrip()
+                if debug:
+                    module_logger.debug(f"command output: {output}")
+                return CommandResult(output=output, is_help=is_help), failed
 
-                except Exception as ex:
-                    module_logger.exception("exception during parsing of arguments")
-                    print(traceback.format_exc())
-                finally:
-                    sys.stdout = old_stdout
+            def remember(cache_key, result: CommandResult, failed: bool) -> CommandResult:
+                if cache_key is not None and not failed:
+                    cmd.cache.put(cache_key, CommandResult(output=result.output, is_help=result.is_help))
+                return result
 
-                output = mystdout.getvalue().rstrip()
-                is_help = False
+            '''
+            splits args and executes method, handles capturing output
+            '''
+            def execute(*args: str, text: str, context: CommandContext = None, user: AuthUser = None) -> CommandResult:
+                # formatting the debug lines costs more than some commands
+                debug = module_logger.isEnabledFor(logging.DEBUG)
+                if debug:
+                    module_logger.debug(f"calling: {parser.prog} args: {args}")
 
+                arguments, output = parse(args)
                 if output:
                     # fancy_output = "> " + output.replace('\n', '\n> ')
-                    module_logger.debug(f"help output: \n{output}")
+                    if debug:
+                        module_logger.debug(f"help output: \n{output}")
                     return CommandResult(output=output, is_help=True)
-                else:
-
-                    # for argument, value in arguments.items():
-                    #     if not value:
-                    #         module_logger.warning(f"argument: {argument} has no value")
-                    #         return f"argument: {argument} has no value"
-
-                    if command_context:
-                        module_logger.debug(f"command context: {command_context}")
-                        arguments[command_context] = context
-                    
-                    if command_user:
-                        module_logger.debug(f"auth_user: {user}")
-                        arguments[command_user] = user
 
-                    if command_text:
-                        module_logger.debug(f"command_text: {text}")
-                        arguments[command_text] = text
-                    
-                    try:
-                        sys.stdout = mystdout = StringIO()
+                # for argument, value in arguments.items():
+                #     if not value:
+                #         module_logger.warning(f"argument: {argument} has no value")
+                #         return f"argument: {argument} has no value"
+
+                cache_key, result = cached(arguments, user)
+                if result:
+                    return result
+                complete(arguments, text, context, user)
+                return remember(cache_key, *run(arguments, debug))
+
+            async def execute_async(*args: str, text: str, context: CommandContext = None, user: AuthUser = None) -> CommandResult:
+                """
+                execute for async functions, runs on the event loop
+                """
+                debug = module_logger.isEnabledFor(logging.DEBUG)
+                if debug:
+                    module_logger.debug(f"calling: {parser.prog} args: {args}")
+
+                arguments, output = parse(args)
+                if output:
+                    if debug:
+                        module_logger.debug(f"help output: \n{output}")
+                    return CommandResult(output=output, is_help=True)
 
-                        module_logger.debug(arguments)
+                cache_key, result = cached(arguments, user)
+                if result:
+                    return result
+                complete(arguments, text, context, user)
+                return remember(cache_key, *await run_async(arguments, debug))
 
-                        ret = func(**arguments)
-                        if type(ret) is str:
-                            print(ret)
-                        elif type(ret) is ResultType:
-                            if ret == ResultType.HELP:
-                                is_help = True
-                        # TODO check if it is HELP
-                    except Exception as ex:
-                        module_logger.exception("exception executing function")
-                        print(traceback.format_exc())
-                    finally:
-                        sys.stdout = old_stdout
-                    output = mystdout.getvalue().rstrip()
-                    module_logger.debug(f"command output: {output}")
-
-                module_logger.debug(f"arguments: {arguments}")
-                return CommandResult(output=output, is_help=is_help)
             cmd: Command = self.cmd_map.get(prog, Command())
+            cmd.prog = prog
+            cmd.aliases = list(aliases)
             cmd.func = execute
+            cmd.coro = None
+            if is_coroutine or is_generator:
+                # a thread without a running loop, like the command pool, can still call it
+                cmd.func = lambda *args, **kwargs: asyncio.run(execute_async(*args, **kwargs))
+                cmd.coro = execute_async
             cmd.parser = parser
+            cmd.binder = ArgumentBinder.compile(added_arguments)
+            cmd.timeout = timeout
+            cmd.limit = limit
+            cmd.cache = result_cache
 
             if command_pattern:
                 def exec_regex(text: str, context: CommandContext = None, user: AuthUser = None) -> CommandResult:#
                     m = command_pattern.fullmatch(text)
                     if m:
-                        module_logger.debug(f"\ncalling: {parser.prog}")
-                        module_logger.debug(f"args: {args}")
+                        debug = module_logger.isEnabledFor(logging.DEBUG)
+                        if debug:
+                            module_logger.debug(f"calling: {parser.prog} text: {text}")
 
                         arguments = m.groupdict()
+                        # the text is part of the key, a match may depend on more than its groups
+                        cache_key, result = cached(arguments, user, text)
+                        if result:
+                            return result
+                        complete(arguments, text, context, user)
+                        return remember(cache_key, *run(arguments, debug))
+                    return None
 
-                        is_help = False
-
-                        if command_context:
-                            module_logger.debug(f"command context: {command_context}")
-                            arguments[command_context] = context
-                        
-                        if command_user:
-                            module_logger.debug(f"auth_user: {user}")
-                            arguments[command_user] = user
-
-                        if command_text:
-                            module_logger.debug(f"command_text: {text}")
-                            arguments[command_text] = text
+                async def exec_regex_async(text: str, context: CommandContext = None, user: AuthUser = None) -> CommandResult:
+                    m = command_pattern.fullmatch(text)
+                    if m:
+                        debug = module_logger.isEnabledFor(logging.DEBUG)
+                        if debug:
+                            module_logger.debug(f"calling: {parser.prog} text: {text}")
 
-                        try:
-                            old_stdout = sys.stdout
-                            sys.stdout = mystdout = StringIO()
-    
-                            module_logger.debug(arguments)
-
-                            ret = func(**arguments)
-                            if type(ret) is str:
-                                print(ret)
-                            elif type(ret) is ResultType:
-                                if ret == ResultType.HELP:
-                                    is_help = True
-                            # TODO check if it is HELP
-                        except Exception as ex:
-                            module_logger.exception("exception executing function")
-                            print(traceback.format_exc())
-                        finally:
-                            sys.stdout = old_stdout
-                    
-                        output = mystdout.getvalue().rstrip()
-                        module_logger.debug(f"command output: {output}")
-                        return CommandResult(output=output, is_help=is_help)
+                        arguments = m.groupdict()
+                        cache_key, result = cached(arguments, user, text)
+                        if result:
+                            return result
+                        complete(arguments, text, context, user)
+                        return remember(cache_key, *await run_async(arguments, debug))
                     return None
+
                 cmd.regex_func = exec_regex
+                cmd.regex_coro = None
+                if is_coroutine or is_generator:
+                    cmd.regex_func = lambda *args, **kwargs: asyncio.run(exec_regex_async(*args, **kwargs))
+                    cmd.regex_coro = exec_regex_async
+                cmd.pattern = command_pattern
             self.cmd_map[prog] = cmd
-            return execute
+            if self.registry is not None:
+                self.registry.add(self.name, prog, cmd, aliases)
+            # the decorator data is only needed until the function is registered
+            for func_map in self.func_maps():
+                func_map.pop(func, None)
+            return cmd.coro or execute
         return func_wrapper
 
+    def func_maps(self) -> List[dict]:
+        return [self.func_arg_map, self.func_context_map, self.func_user_map, self.func_text_map, self.func_pattern_map, self.func_cache_map]
+
+    def validate(self):
+        """
+        raises ValueError if a command of the handler can not be called
+        """
+        for prog, cmd in self.cmd_map.items():
+            if not cmd.func or not cmd.parser:
+                raise ValueError(f"command '{prog}' of handler '{self.name}' is incomplete")
+            try:
+                cmd.parser.format_help()
+            except Exception as ex:
+                raise ValueError(f"help of command '{prog}' of handler '{self.name}' fails: {ex}") from ex
+
+    def release(self):
+        """
+        drops everything the handler holds, once it has been replaced
+        """
+        for cmd in self.cmd_map.values():
+            if cmd.cache:
+                cmd.cache.clear()
+        self.cmd_map.clear()
+        for func_map in self.func_maps():
+            func_map.clear()
+        self.registry = None
+
     def argument(self, arg_type: str = "positional", dest: str = None, name: str = None, short: str = None, **kwargs):
         def func_wrapper(func):
             argspec: inspect.FullArgSpec = inspect.getfullargspec(func)
@@ -370,6 +534,17 @@ class CommandHandler:
             return func
         return func_wrapper
 
+    def cache(self, ttl: float = None, maxsize: int = 128, per_user: bool = False):
+        """
+        memoizes the results of a command by its arguments, and with `per_user` also by the caller,
+        for commands whose output only depends on those, results are dropped after `ttl` seconds,
+        when more than `maxsize` are kept and when the module is reloaded
+        """
+        def func_wrapper(func):
+            self.func_cache_map[func] = ResultCache(ttl=ttl, maxsize=maxsize, per_user=per_user)
+            return func
+        return func_wrapper
+
     def regex(self, pattern_data):
         def func_wrapper(func):
             if type(pattern_data) == str:
@@ -406,7 +581,7 @@ class CommandHandler:
         return copy.copy(self.cmd_map)
 
 class LibCord:
-    def __init__(self, username, prefix: str = '.', token: str = None, host: str = 'localhost', port: int = 4242, pastebin: dict = None, auth: dict = None):
+    def __init__(self, username, prefix: str = '.', token: str = None, host: str = 'localhost', port: int = 4242, pastebin: dict = None, auth: dict = None, ingest: str = 'poll', poll_interval: float = 0.1, stream: dict = None, http: dict = None, consumers: int = 4, command_timeout: float = 10.0, command_workers: int = 4, regex_on_commands: bool = False, wiki: dict = None, store: dict = None, outbound: dict = None, queue: dict = None, metrics: dict = None, capture: dict = None, tracing: dict = None, modules: dict = None, ratelimit: dict = None, spool: dict = None):
         from libcord.loader import ModLoader
         
         if not username:
@@ -417,56 +592,137 @@ class LibCord:
         self.host = host
         self.port = port
 
+        if ingest not in ('poll', 'stream'):
+            raise ValueError(f"unknown ingest mode '{ingest}'")
+        self.ingest = ingest
+        self.poll_interval = poll_interval
+        self.consumers = max(1, consumers)
+        self.command_timeout = command_timeout
+        self.regex_on_commands = regex_on_commands
+        self.stream = MatterbridgeStream(**(stream or {}))
+
         # self.pastebin = pastebin
 
         self.auth = None
         if auth:
             self.auth = Authenticator(send=self.send, **auth)
 
-        self.loader = ModLoader(self)
+        self.loader = ModLoader(self, **(modules or {}))
 
         self.cmd_handlers = dict()
-        self.session = requests.Session()
-        self.wiki = Gitwiki(url="git@github.com:NikkyAI/pyCord.wiki.git", web_url_base="https://github.com/NikkyAI/pyCord/wiki")
-        if token:
-            self.session.headers = {'Authorization': f"Bearer {token}"}
+        self.registry = CommandRegistry()
+        self.staged = None
+        self.help_texts: Dict[str, str] = {}
+        self.listing: str = None
+        self.regex_dispatcher = RegexDispatcher([])
+        self.transport: Transport = create_transport(f"http://{self.host}:{self.port}", token=token, **(http or {}))
+        store = dict(store or {})
+        backend = store.pop('backend', 'gitwiki')
+        self.wiki = None
+        if backend == 'gitwiki':
+            wiki = {'url': "git@github.com:NikkyAI/pyCord.wiki.git", 'web_url_base': "https://github.com/NikkyAI/pyCord/wiki", **(wiki or {})}
+            self.wiki = Gitwiki(**wiki)
+            self.store = OutputStore(self.wiki, **store)
+        elif backend == 'local':
+            options = {key: store.pop(key) for key in ('hash_length', 'max_known') if key in store}
+            self.store = OutputStore(LocalStore(**store), **options)
+        else:
+            raise ValueError(f"unknown store backend '{backend}'")
+        self.command_executor = ThreadPoolExecutor(max_workers=command_workers, thread_name_prefix='libcord-command')
         
-        self.q = asyncio.Queue()
+        queue = dict(queue or {})
+        self.q = IngestQueue(self.is_command, lanes=self.consumers, lane_of=self.lane_of, **queue)
+        self.outbox = Outbox(self.transport, **(outbound or {}))
+
+        self.metrics = _metrics
+        self.instance = f"{username}-{next(_instances)}"
+        self.metrics.gauge('libcord_queue_depth', "messages waiting to be handled", self.q.qsize, self.instance)
+        self.metrics.gauge('libcord_outbound_depth', "replies waiting to be sent", lambda: self.outbox.depth(), self.instance)
+        metrics = dict(metrics or {})
+        if metrics.get('port') is not None:
+            self.metrics.serve(**metrics)
+
+        self.capture = None
+        if capture:
+            self.capture = TrafficCapture(**capture)
+        self.tracer = Tracer(**(tracing or {}))
+        self.limiter = RateLimiter(**ratelimit) if ratelimit else None
+        self.spool = None
+        if spool:
+            self.spool = MessageSpool(**spool)
+            self.q.on_drop = self.spool.done
+            self.metrics.gauge('libcord_spool_outstanding', "received messages not handled yet", self.spool.depth, self.instance)
 
     def create_handler(self, name: str) -> CommandHandler:
-        handler: CommandHandler = CommandHandler(name=name)
-        self.cmd_handlers[name] = handler
+        registry, cmd_handlers = self.staged or (self.registry, self.cmd_handlers)
+        # a handler created again replaces all commands of the previous one
+        registry.remove_handler(name)
+        handler: CommandHandler = CommandHandler(name=name, registry=registry)
+        cmd_handlers[name] = handler
         return handler
 
-    def send(self, message: Message):
+    @contextmanager
+    def stage_commands(self):
+        """
+        handlers created inside the block are registered off to the side, validated
+        and swapped in at once when it exits without error, messages in flight
+        finish with the handlers they started with
+        """
+        self.staged = (self.registry.copy(), dict(self.cmd_handlers))
+        try:
+            yield self.staged[0]
+            registry, cmd_handlers = self.staged
+        finally:
+            self.staged = None
+        replaced = [handler for name, handler in self.cmd_handlers.items() if cmd_handlers.get(name) is not handler]
+        for name, handler in cmd_handlers.items():
+            if self.cmd_handlers.get(name) is not handler:
+                handler.validate()
+        regex_dispatcher = RegexDispatcher(registry.unique().items())
+        self.registry, self.cmd_handlers, self.regex_dispatcher = registry, cmd_handlers, regex_dispatcher
+        for handler in replaced:
+            handler.release()
+
+    def send(self, message: Message) -> asyncio.Future:
+        """
+        queues a message in the outbox, the returned future is True once it is posted,
+        messages to the same gateway are posted in order, different gateways concurrently
+        """
         if not message.username:
             message.username = self.username
-        dict_dump = vars(message)
-        dict_dump = {key: dict_dump[key] for key in dict_dump if dict_dump[key]}
-        module_logger.debug(f"message: {dict_dump}")
-        module_logger.debug(f"message as json: {json.dumps(dict_dump)}")
-        url = f"http://{self.host}:{self.port}/api/message"
-        response = self.session.post(url, json=dict_dump)
-        response.raise_for_status()    
+        dict_dump = message.as_dict()
+        if module_logger.isEnabledFor(logging.DEBUG):
+            module_logger.debug(f"message as json: {json.dumps(dict_dump)}")
+        future = self.outbox.put(dict_dump)
+        trace = current_trace()
+        if trace:
+            span = trace.span('send', message.gateway)
+            future.add_done_callback(lambda f: trace.close(span))
+        return future
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        if _shlex_special.search(text):
+            return shlex.split(text)
+        return [token for token in _shlex_whitespace.split(text) if token]
 
     def call(self, text: str, context: CommandContext = CommandContext.NONE, user: AuthUser = None) -> CommandResult:
         try:
-            tokens = shlex.split(text)
+            tokens = self.tokenize(text)
             prog = tokens[0]
             args = tokens[1:]
-            cmd: Command = None
-            for handler_name, cmd_handler in self.cmd_handlers.items():
-                if prog in cmd_handler.cmd_map:
-                    cmd = cmd_handler.cmd_map[prog]
-                    break
+            cmd: Command = self.lookup(prog)
 
             if not cmd:
                 module_logger.error(f"command '{prog}' not found")
                 return CommandResult(output=f"no function {prog} found", cmd=None)
             func = cmd.func
             if func:
+                start = perf_counter()
                 exec_result: CommandResult = func(context=context, user=user, text=text, *args)
-                exec_result.cmd = prog
+                command_seconds.labels(cmd.prog).observe(perf_counter() - start)
+                commands_total.labels(cmd.prog).inc()
+                exec_result.cmd = cmd.prog
                 return exec_result
             else:
                 return CommandResult(output=f"no function {prog} found", cmd=None)
@@ -474,87 +730,429 @@ class LibCord:
             module_logger.exception("Error parsing input")
             return CommandResult(output=f"Error parsing input: {str(ex)}", cmd=None)
             # return traceback.format_exc() #TODO: get better message
-    
-    def call_regex(self, text: str, context: CommandContext = CommandContext.NONE, user: AuthUser = None) -> List[CommandResult]:
+
+    async def call_async(self, text: str, context: CommandContext = CommandContext.NONE, user: AuthUser = None, timeout: float = None) -> CommandResult:
+        """
+        coroutine variant of call, async commands are awaited on the loop and
+        all others run on the command pool, raises CommandTimeout after `timeout` seconds
+        """
+        try:
+            tokens = self.tokenize(text)
+            prog = tokens[0]
+            args = tokens[1:]
+        except Exception as ex:
+            module_logger.exception("Error parsing input")
+            return CommandResult(output=f"Error parsing input: {str(ex)}", cmd=None)
+        # not loaded yet or blocking, lazy imports happen on the pool as well
+        cmd: Command = self.registry.lookup(prog)
+        if not cmd or not cmd.coro:
+            return await self.run_command(self.call, text=text, context=context, user=user, timeout=timeout)
+        exec_result: CommandResult = await self.await_command(cmd.prog, cmd.coro(context=context, user=user, text=text, *args), timeout=timeout)
+        commands_total.labels(cmd.prog).inc()
+        exec_result.cmd = cmd.prog
+        return exec_result
+
+    def lookup(self, name: str) -> Command:
+        """
+        the command registered under a name or alias, imports its module first when it is loaded lazily
+        """
+        cmd: Command = self.registry.lookup(name)
+        if cmd is None and self.loader.load_for(name):
+            cmd = self.registry.lookup(name)
+        return cmd
+
+    def render_help(self):
+        """
+        renders the help of every command and the command listing ahead of time,
+        ModLoader calls this after every load and reload
+        """
+        help_texts = {name: cmd.parser.format_help().rstrip() for name, cmd in self.registry.commands.items()}
+        self.help_texts, self.listing = help_texts, self.render_listing()
+
+    def render_listing(self) -> str:
+        lines = []
+        for group, cmd_group in self.cmd_handlers.items():
+            lines.append(group.upper())
+            for key, cmd in cmd_group.cmd_map.items():
+                desc = ""
+                if cmd.parser.description:
+                    desc = ": " +cmd.parser.description
+                aliases = ""
+                if cmd.aliases:
+                    aliases = " (" + ", ".join(cmd.aliases) + ")"
+                lines.append(f"\t{key}{aliases}{desc}")
+        for module, names in self.loader.pending_modules().items():
+            lines.append(f"{module.upper()} (loaded on first use)")
+            for name in names:
+                lines.append(f"\t{name}")
+        return "\n".join(lines)
+
+    def help_text(self, name: str) -> str:
+        """
+        cached help of a command or alias, None if there is no such command
+        """
+        help_text = self.help_texts.get(name)
+        if help_text is None:
+            cmd: Command = self.lookup(name)
+            if not cmd:
+                return None
+            help_text = self.help_texts[name] = cmd.parser.format_help().rstrip()
+        return help_text
+
+    def command_listing(self) -> str:
+        """
+        cached listing of all commands by handler
+        """
+        if self.listing is None:
+            self.listing = self.render_listing()
+        return self.listing
+
+    def cache_stats(self) -> Dict[str, dict]:
+        """
+        result cache statistics of every command that caches its results
+        """
+        return {name: cmd.cache.stats() for name, cmd in self.registry.unique().items() if cmd.cache}
+
+    def build_regex_dispatch(self):
+        """
+        recompiles the regex dispatcher from all registered commands,
+        needs to run after commands were registered or replaced
+        """
+        self.regex_dispatcher = RegexDispatcher(self.registry.unique().items())
+
+    def call_regex(self, text: str, context: CommandContext = CommandContext.NONE, user: AuthUser = None, entries: List[RegexEntry] = None) -> List[CommandResult]:
+        """
+        runs the regex commands matching `text`, or only the candidates in `entries`
+        """
         try:
             results = list()
-            for handler_name, cmd_handler in self.cmd_handlers.items():
-                for prog, cmd in cmd_handler.cmd_map.items():
-                    if cmd.regex_func:
-                        # TODO: wrap in try catch ?
-                        result = cmd.regex_func(text=text, context=context, user=user)
-                        if result:
-                            result.cmd = prog
-                            results.append(result)
+            for entry in (self.regex_dispatcher.candidates(text) if entries is None else entries):
+                # TODO: wrap in try catch ?
+                start = perf_counter()
+                result = entry.cmd.regex_func(text=text, context=context, user=user)
+                command_seconds.labels(entry.prog).observe(perf_counter() - start)
+                if result:
+                    commands_total.labels(entry.prog).inc()
+                    result.cmd = entry.prog
+                    results.append(result)
             return results
         except Exception as ex:
             module_logger.exception("Error parsing input")
             return CommandResult(output=f"Error parsing input: {str(ex)}", cmd=None)
             # return traceback.format_exc() #TODO: get better message
-    
+
+    async def call_regex_async(self, text: str, context: CommandContext = CommandContext.NONE, user: AuthUser = None, entries: List[RegexEntry] = None, timeout: float = None) -> List[CommandResult]:
+        """
+        coroutine variant of call_regex, async regex commands run concurrently on the loop,
+        the others together on the command pool, a command that does not finish within
+        `timeout` seconds is cancelled and left out of the results
+        """
+        if entries is None:
+            entries = self.regex_dispatcher.candidates(text)
+        awaited = [entry for entry in entries if entry.cmd.regex_coro]
+        blocking = [entry for entry in entries if not entry.cmd.regex_coro]
+        jobs = [self.await_command(entry.prog, entry.cmd.regex_coro(text=text, context=context, user=user), timeout=timeout) for entry in awaited]
+        if blocking:
+            jobs.append(self.run_command(self.call_regex, text=text, context=context, user=user, entries=blocking, timeout=timeout))
+        outcomes = await asyncio.gather(*jobs, return_exceptions=True)
+        by_prog: Dict[str, CommandResult] = {}
+        for entry, result in zip(awaited, outcomes):
+            if isinstance(result, BaseException):
+                module_logger.error(str(result))
+            elif result:
+                commands_total.labels(entry.prog).inc()
+                result.cmd = entry.prog
+                by_prog[entry.prog] = result
+        if blocking:
+            result = outcomes[-1]
+            if isinstance(result, BaseException):
+                module_logger.error(str(result))
+            else:
+                by_prog.update((regex_result.cmd, regex_result) for regex_result in result)
+        # in the order of the candidates, as call_regex returns them
+        return [by_prog[entry.prog] for entry in entries if entry.prog in by_prog]
+
+    def is_command(self, message: Message) -> bool:
+        """
+        True if a message calls a prefix command or may trigger a regex command
+        """
+        text = message.text or ''
+        return text.startswith(self.prefix) or bool(self.regex_dispatcher.candidates(text))
+
+    def lane_of(self, message: Message) -> int:
+        """
+        consumer lane of a message, stable per gateway so replies keep their order
+        """
+        return zlib.crc32((message.gateway or '').encode()) % self.consumers
+
     async def consume_message(self):
+        """
+        handles the messages of every consumer lane of the queue
+        """
+        # every lane waits on its own, a slow gateway only holds up its own lane
+        workers = [asyncio.ensure_future(self.consume_lane(lane)) for lane in range(self.consumers)]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+    async def consume_lane(self, lane: int):
         while True:
-            message: Message = await self.q.get()
+            message: Message = await self.q.get(lane)
+            start = perf_counter()
+            trace = self.tracer.take(message)
+            replies = None
+            try:
+                if trace:
+                    trace.add('ingest', trace.start, start)
+                    with self.tracer.activate(trace):
+                        replies = await self.handle_message(message)
+                else:
+                    replies = await self.handle_message(message)
+            except Exception as ex:
+                module_logger.exception(f"error handling {message}")
+            if self.spool:
+                self.release(message, replies)
+            stage_seconds.labels('handle').observe(perf_counter() - start)
+
+    def release(self, message: Message, replies: List[asyncio.Future]):
+        """
+        marks a handled message as done in the spool once its replies are posted,
+        a crash before that handles it again after the restart
+        """
+        if not replies:
+            self.spool.done(message)
+            return
+        posted = asyncio.gather(*replies, return_exceptions=True)
+        posted.add_done_callback(lambda f: self.spool.done(message))
+
+    async def upload(self, cmd: str, content: str, is_help: bool) -> str:
+        """
+        stores multi-line output of a command and returns its url
+        """
+        start = perf_counter()
+        try:
+            return self.store.put(cmd, content, is_help=is_help)
+        finally:
+            end = perf_counter()
+            stage_seconds.labels('upload').observe(end - start)
+            trace = current_trace()
+            if trace:
+                trace.add('upload', start, end, cmd)
+
+    def timeout_of(self, text: str) -> float:
+        """
+        time limit of the command called by `text`
+        """
+        cmd: Command = self.registry.lookup(text.split(None, 1)[0]) if text.strip() else None
+        if cmd and cmd.timeout is not None:
+            return cmd.timeout
+        return self.command_timeout
+
+    async def run_command(self, func: Callable[..., Any], *args, timeout: float = None, **kwargs):
+        """
+        runs a blocking command function on the command pool,
+        cancels it and raises CommandTimeout after `timeout` seconds
+        """
+        loop = asyncio.get_event_loop()
+        job = CommandJob(func, *args, **kwargs)
+        future = loop.run_in_executor(self.command_executor, job.run)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            job.cancel()
+            # the result of a cancelled job is of no interest anymore
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            raise CommandTimeout(f"{func} did not finish within {timeout}s")
+
+    async def await_command(self, prog: str, coro: Awaitable[Any], timeout: float = None):
+        """
+        awaits an async command on the loop, cancels it and raises CommandTimeout after `timeout` seconds
+        """
+        start = perf_counter()
+        try:
+            return await asyncio.wait_for(coro, timeout)
+        except asyncio.TimeoutError:
+            raise CommandTimeout(f"{prog} did not finish within {timeout}s")
+        finally:
+            command_seconds.labels(prog).observe(perf_counter() - start)
+
+    async def handle_message(self, message: Message) -> List[asyncio.Future]:
+        """
+        runs the commands a message triggers, returns the send futures of the replies
+        """
+        text: str = message.text
+        # formatting the debug lines costs more than most messages take to handle
+        debug = module_logger.isEnabledFor(logging.DEBUG)
+        if debug:
             module_logger.debug(message)
-            text: str = message.text
             module_logger.debug(f"text: {text}")
-            # handle responses from auth bots
-            cmd_result: CommandResult = None
+        # handle responses from auth bots
+        cmd_result: CommandResult = None
+        user = None
+        trace = current_trace()
+        if self.auth:
+            start = perf_counter()
             user = self.auth.identify(message.username, message.account)
-            results = self.call_regex(text=text, context=CommandContext(message), user=user)
-            if len(results):
-                for regex_result in results:
-                    if regex_result.output:
+            end = perf_counter()
+            stage_seconds.labels('auth').observe(end - start)
+            if trace:
+                trace.add('auth', start, end)
+        results = []
+        replies = []
+        # the bots own replies and prefixed commands are not scanned unless configured
+        own = message.username == self.username
+        scan = not own and (self.regex_on_commands or not text.startswith(self.prefix))
+        candidates = self.regex_dispatcher.candidates(text) if scan else []
+        if candidates and self.q.skip_regex(message):
+            candidates = []
+        if self.limiter and not own and (candidates or text.startswith(self.prefix)):
+            commands = [entry.cmd for entry in candidates]
+            if text.startswith(self.prefix) and text[1:].strip():
+                name = text[1:].split(None, 1)[0]
+                cmd = self.registry.lookup(name)
+                if cmd is None and name in self.loader.pending:
+                    # the limit class of a lazy command is only known once its module is imported, on the pool
+                    cmd = await asyncio.get_event_loop().run_in_executor(self.command_executor, self.lookup, name)
+                commands.append(cmd)
+            reason = self.limiter.allow(self.limiter.identity(user, message.username, message.account), message.gateway, text, commands)
+            if reason:
+                limited_total.labels(reason).inc()
+                if debug:
+                    module_logger.debug(f"not running '{text}' by {message.username}: {reason}")
+                return replies
+        if candidates:
+            start = perf_counter()
+            results = await self.call_regex_async(text, context=CommandContext(message), user=user, entries=candidates, timeout=self.command_timeout)
+            end = perf_counter()
+            stage_seconds.labels('regex').observe(end - start)
+            if trace:
+                trace.add('regex', start, end, ",".join(result.cmd for result in results))
+        if len(results):
+            for regex_result in results:
+                if regex_result.output:
+                    if debug:
                         module_logger.debug(f"return value: {regex_result.output}")
-                        if '\n' in regex_result.output:
-                            github_url = self.wiki.upload(f"command/{regex_result.cmd}", regex_result.output, is_help=regex_result.is_help)
-                            self.send(message.create_response(github_url))
-                        else:
-                            self.send(message.create_response(regex_result.cmd+": "+regex_result.output))
-            if text.startswith(self.prefix):
+                    if '\n' in regex_result.output:
+                        github_url = await self.upload(regex_result.cmd, regex_result.output, is_help=regex_result.is_help)
+                        replies.append(self.send(message.create_response(github_url)))
+                    else:
+                        replies.append(self.send(message.create_response(regex_result.cmd+": "+regex_result.output)))
+        if text.startswith(self.prefix):
+            if debug:
                 module_logger.debug(f"command: '{text}' by {message.username}")
-                cmd=text[1:]
-                cmd_result: CommandResult = self.call(text=cmd, context=CommandContext(message), user=user)
-            if cmd_result:
-                # response = message.username + ": " + ret
-                if cmd_result.output:
+            cmd=text[1:]
+            timeout = self.timeout_of(cmd)
+            start = perf_counter()
+            try:
+                cmd_result: CommandResult = await self.call_async(cmd, context=CommandContext(message), user=user, timeout=timeout)
+            except CommandTimeout as ex:
+                module_logger.error(str(ex))
+                cmd_result = CommandResult(output=f"{cmd.split(None, 1)[0]}: timed out after {timeout}s")
+            end = perf_counter()
+            stage_seconds.labels('call').observe(end - start)
+            if trace:
+                trace.add('call', start, end, cmd_result.cmd)
+        if cmd_result:
+            # response = message.username + ": " + ret
+            if cmd_result.output:
+                if debug:
                     module_logger.debug(f"return value: {cmd_result.output}")
-                    if '\n' in cmd_result.output:
-                        # if cmd_result.help or not self.pastebin or 'token' not in self.pastebin:
-                            #TODO: if return value is multiline.. git wiki
-                            github_url = self.wiki.upload(f"command/{cmd_result.cmd}", cmd_result.output, is_help=cmd_result.is_help)
-                            self.send(message.create_response(github_url))
-                        # else:
-                        #     TODO: fix pastebin or similar service
-                        #     url = pastebin.paste(self.pastebin['token'], cmd_result.output, paste_name=cmd_result.cmd + "_output", paste_private="unlisted", paste_expire_date='1H', paste_format=None)
-                        #     self.send(message.create_response(url))
-                    else:
-                        self.send(message.create_response(cmd_result.output))
-
+                if '\n' in cmd_result.output:
+                    # if cmd_result.help or not self.pastebin or 'token' not in self.pastebin:
+                        #TODO: if return value is multiline.. git wiki
+                        github_url = await self.upload(cmd_result.cmd, cmd_result.output, is_help=cmd_result.is_help)
+                        replies.append(self.send(message.create_response(github_url)))
+                    # else:
+                    #     TODO: fix pastebin or similar service
+                    #     url = pastebin.paste(self.pastebin['token'], cmd_result.output, paste_name=cmd_result.cmd + "_output", paste_private="unlisted", paste_expire_date='1H', paste_format=None)
+                    #     self.send(message.create_response(url))
+                else:
+                    replies.append(self.send(message.create_response(cmd_result.output)))
+        return replies
 
     async def produce_message(self):
-        while True:
+        if self.spool:
+            await self.resume()
+        if self.ingest == 'stream':
+            await self.stream_message()
+        else:
+            await self.poll_message()
+
+    async def poll_message(self, duration: float = None):
+        """
+        polls /api/messages every poll_interval seconds, forever or for `duration` seconds
+        """
+        loop = asyncio.get_event_loop()
+        end = loop.time() + duration if duration is not None else None
+        while end is None or loop.time() < end:
             try:
-                url = f"http://{self.host}:{self.port}/api/messages"
-                response = self.session.get(url)
-                response.raise_for_status()
-                if response.content:
-                    msg_list = response.json()
-                    for message_dict in msg_list:
-                        message: Message = Message(**message_dict)
-                        # message.libcord = self
-                        # result = self.handle_message(message) #TODO: look up await ?
-                        
-                        await self.q.put(message)
-                        # module_logger.debug("added: " + str(message))
-
-            except requests.exceptions.ConnectionError as err:
+                start = perf_counter()
+                msg_list = self.stream.unseen(await self.transport.get_messages())
+                stage_seconds.labels('poll').observe(perf_counter() - start)
+                for message in msg_list:
+                    # message.libcord = self
+                    # result = self.handle_message(message) #TODO: look up await ?
+                    
+                    await self.receive(message, source='poll')
+                    # module_logger.debug("added: " + str(message))
+
+            except OSError as err:
                 module_logger.exception("api endpoint not running")
                 #TODO: retry with increasing timeout up until max (of 20s ? )
 
             except Exception as ex:
                 module_logger.exception("unknown error")
-            await asyncio.sleep(0.1)
+            await asyncio.sleep(self.poll_interval)
+
+    async def resume(self):
+        """
+        queues the messages the spool recovered from the previous run, ahead of new ones
+        """
+        messages, self.spool.recovered = self.spool.recovered, []
+        for message in messages:
+            messages_total.labels('spool').inc()
+            await self.q.put(message)
+
+    async def receive(self, message: Message, source: str = 'stream'):
+        """
+        queues a message from matterbridge, recording it first when capturing
+        and keeping it in the spool until it is handled
+        """
+        messages_total.labels(source).inc()
+        if self.capture:
+            self.capture.record(message)
+        if self.spool:
+            self.spool.append(message)
+        self.tracer.begin(message)
+        await self.q.put(message)
+
+    async def receive_streamed(self, message: Message):
+        self.stream.delivered(message)
+        await self.receive(message)
+
+    async def stream_message(self):
+        """
+        keeps one connection to /api/stream open and queues every event as it arrives,
+        reconnects with backoff and polls for a while when the stream keeps failing
+        """
+        failures = 0
+        while True:
+            try:
+                count = await self.transport.stream(self.stream, self.receive_streamed)
+                module_logger.warning(f"stream closed after {count} messages, reconnecting")
+                failures = 0
+                await asyncio.sleep(self.stream.reconnect_delay)
+            except Exception as ex:
+                failures += 1
+                module_logger.error(f"stream connection failed ({failures}): {ex}")
+                if failures >= self.stream.fallback_after:
+                    module_logger.warning(f"falling back to polling for {self.stream.fallback_duration}s")
+                    await self.poll_message(duration=self.stream.fallback_duration)
+                    failures = 0
+                else:
+                    await asyncio.sleep(self.stream.backoff(failures))
     
     def start(self):
         module_logger.info("starting loop")
@@ -562,4 +1160,6 @@ class LibCord:
         loop = asyncio.get_event_loop()
         loop.create_task(self.produce_message())
         loop.create_task(self.consume_message())
+        if self.loader.watch:
+            loop.create_task(self.loader.watch_modules())
         loop.run_forever()
\ No newline at end of file
@@ -1,10 +1,11 @@
 from .message import Message
 import json
-from typing import Callable, Any
+from typing import Callable, Any, Dict
 from random import SystemRandom
 from collections import deque
 import logging
 from pathlib import Path
+from time import monotonic
 import yaml
 
 module_logger = logging.getLogger('libcord.auth')
@@ -17,28 +18,86 @@ class AuthUser(object):
         self.id = id
     
     def __repr__(self):
-        return yaml.dump(self)
+        return f"AuthUser(username={self.username!r}, account={self.account!r}, id={self.id!r})"
+
+class AccountIndex(object):
+    """
+    users of one auth/<account>.txt file by username and nickname
+    """
+    def __init__(self, account: str, mtime: float = None, account_data: dict = None):
+        self.account = account
+        self.mtime = mtime
+        self.users: Dict[str, AuthUser] = {}
+        if account_data:
+            by_username = {}
+            by_nickname = {}
+            for user_id, user in account_data['users'].items():
+                auth_user = AuthUser(account=account, id=user_id, **user)
+                by_username.setdefault(user['username'], auth_user)
+                if 'nickname' in user:
+                    by_nickname.setdefault(user['nickname'], auth_user)
+            # a username match always wins over a nickname match
+            self.users = {**by_nickname, **by_username}
+
 
 class Authenticator(object):
 
-    def __init__(self, send: Callable[[Message], None], gateway: str="api-auth"):
+    def __init__(self, send: Callable[[Message], None], gateway: str="api-auth", directory: str = 'auth', check_interval: float = 1.0):
         self.send = send
         self.gateway = gateway
         self.random = SystemRandom()
+        self.directory = directory
+        # seconds an account file is trusted before its mtime is checked again
+        self.check_interval = check_interval
+        self.accounts: Dict[str, AccountIndex] = {}
+        self.checked: Dict[str, float] = {}
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
 
-    def identify(self, name: str, account: str) -> AuthUser:
-        p = Path('auth/', f"{account}.txt")
-        if p.exists():
-            with open(p, 'r') as f:
-                account_data = yaml.load(f.read())
-                for user_id, user in account_data['users'].items():
-                    if name == user['username']:
-                        return AuthUser(account=account, id=user_id, **user)
-                for user_id, user in account_data['users'].items():
-                    if 'nickname' in user:
-                        if name == user['nickname']:
-                            return AuthUser(account=account, id=user_id, **user)
-            module_logger.error('no user found')
-        else:
+    def index(self, account: str) -> AccountIndex:
+        """
+        the cached index of an account, reloaded when its file changed
+        """
+        now = monotonic()
+        index = self.accounts.get(account)
+        if index and now - self.checked[account] < self.check_interval:
+            return index
+        self.checked[account] = now
+        p = Path(self.directory, f"{account}.txt")
+        try:
+            mtime = p.stat().st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if index and index.mtime == mtime:
+            return index
+        self.misses += 1
+        if mtime is None:
             module_logger.warning(f"file: {p} does not exist")
-        return None
\ No newline at end of file
+            index = AccountIndex(account)
+        else:
+            module_logger.debug(f"loading {p}")
+            with open(p, 'r') as f:
+                index = AccountIndex(account, mtime, yaml.safe_load(f.read()))
+        self.accounts[account] = index
+        return index
+
+    def identify(self, name: str, account: str) -> AuthUser:
+        misses = self.misses
+        user = self.index(account).users.get(name)
+        if user:
+            if misses == self.misses:
+                self.hits += 1
+            return user
+        if misses == self.misses:
+            self.negative_hits += 1
+        module_logger.debug(f"no user {name} found in {account}")
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'accounts': len(self.accounts),
+            'hits': self.hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+        }
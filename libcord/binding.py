@@ -0,0 +1,70 @@
+import logging
+from typing import List, Tuple
+
+module_logger = logging.getLogger('libcord.binding')
+
+
+class ArgumentBinder(object):
+    """
+    binds command tokens to simple positional signatures without going through argparse,
+    anything it does not handle itself is left to the parser
+    """
+    simple_types = (None, str, int, float)
+    simple_keys = {'dest', 'type', 'default', 'nargs', 'help', 'metavar'}
+
+    def __init__(self, specs: List[Tuple[str, type, bool, object]]):
+        self.specs = specs
+        self.required = sum(1 for dest, arg_type, optional, default in specs if not optional)
+
+    @classmethod
+    def compile(cls, arguments: List[Tuple[str, List[str], dict]]) -> 'ArgumentBinder':
+        """
+        binder for the arguments added to a parser as (arg_type, names, data),
+        None if the signature needs argparse
+        """
+        specs = []
+        seen_optional = False
+        for arg_type, names, data in arguments:
+            if arg_type != 'positional' or names or set(data) - cls.simple_keys:
+                return None
+            nargs = data.get('nargs')
+            value_type = data.get('type')
+            if nargs not in (None, '?') or value_type not in cls.simple_types:
+                return None
+            optional = nargs == '?'
+            if seen_optional and not optional:
+                # argparse distributes tokens differently here
+                return None
+            seen_optional = seen_optional or optional
+            default = data.get('default')
+            if isinstance(default, str) and value_type not in (None, str):
+                # argparse converts string defaults like command line values
+                try:
+                    default = value_type(default)
+                except (TypeError, ValueError):
+                    return None
+            specs.append((data['dest'], value_type, optional, default))
+        return cls(specs)
+
+    def bind(self, args: Tuple[str, ...]) -> dict:
+        """
+        arguments for the command function, None if argparse has to handle the tokens,
+        eg. for --help, a wrong number of tokens or a value that does not convert
+        """
+        if not self.required <= len(args) <= len(self.specs):
+            return None
+        arguments = {}
+        for index, (dest, value_type, optional, default) in enumerate(self.specs):
+            if index < len(args):
+                value = args[index]
+                if value.startswith('-'):
+                    return None
+                if value_type is not None and value_type is not str:
+                    try:
+                        value = value_type(value)
+                    except (TypeError, ValueError):
+                        return None
+            else:
+                value = default
+            arguments[dest] = value
+        return arguments
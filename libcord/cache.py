@@ -0,0 +1,84 @@
+from collections import OrderedDict
+import logging
+import threading
+from time import monotonic
+from typing import Any, Hashable
+
+module_logger = logging.getLogger('libcord.cache')
+
+_missing = object()
+
+
+class ResultCache(object):
+    """
+    least recently used results of one command, entries older than `ttl` seconds
+    are not used anymore, a ttl of None keeps them until they are evicted
+    """
+    def __init__(self, ttl: float = None, maxsize: int = 128, per_user: bool = False):
+        self.ttl = ttl
+        self.maxsize = max(1, maxsize)
+        self.per_user = per_user
+        self.entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        # commands run on several threads at once
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(arguments: dict, user=None, text: str = None) -> Hashable:
+        """
+        hashable key of bound arguments, None if an argument can not be hashed
+        """
+        items = []
+        for name, value in sorted(arguments.items()):
+            if isinstance(value, list):
+                value = tuple(value)
+            try:
+                hash(value)
+            except TypeError:
+                return None
+            items.append((name, value))
+        if text is not None:
+            items.append((None, text))
+        if user is not None:
+            items.append((None, (user.account, user.id)))
+        return tuple(items)
+
+    def get(self, key: Hashable) -> Any:
+        """
+        the cached value, _missing if there is none
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                stored, value = entry
+                if self.ttl is None or monotonic() - stored < self.ttl:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self.entries[key]
+            self.misses += 1
+            return _missing
+
+    def put(self, key: Hashable, value: Any):
+        with self.lock:
+            self.entries[key] = (monotonic(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        calls = self.hits + self.misses
+        return {
+            'size': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / calls if calls else 0.0,
+        }
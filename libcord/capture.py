@@ -0,0 +1,58 @@
+import json
+import logging
+from pathlib import Path
+from time import monotonic
+from typing import Iterator, Tuple
+
+from .message import Message
+
+module_logger = logging.getLogger('libcord.capture')
+
+
+class TrafficCapture(object):
+    """
+    appends every received message to a JSONL file, one line per message:
+
+        {"at":12.345,"message":{"text":"...","gateway":"...",...}}
+
+    `at` is the arrival time in seconds since the capture was opened,
+    empty fields of the message are left out
+    """
+    def __init__(self, path: str, flush_interval: float = 1.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.flush_interval = flush_interval
+        self.file = open(self.path, 'a', buffering=1 << 16)
+        self.started = monotonic()
+        self.flushed = self.started
+        self.count = 0
+        module_logger.info(f"capturing traffic to {self.path}")
+
+    def record(self, message: Message):
+        now = monotonic()
+        data = message.as_dict()
+        self.file.write(json.dumps({'at': round(now - self.started, 6), 'message': data}, separators=(',', ':')) + '\n')
+        self.count += 1
+        if now - self.flushed >= self.flush_interval:
+            self.file.flush()
+            self.flushed = now
+
+    def close(self):
+        self.file.close()
+
+
+def read_capture(path: str) -> Iterator[Tuple[float, Message]]:
+    """
+    (arrival time, message) of every line of a capture, a capture appended
+    to by several runs restarts its arrival times with each run
+    """
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                yield entry['at'], Message.from_dict(entry['message'])
+            except (ValueError, KeyError, TypeError) as err:
+                # the last line of a capture that was not closed may be cut off
+                module_logger.warning(f"{path}:{number}: skipping invalid line: {err}")
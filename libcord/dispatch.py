@@ -0,0 +1,128 @@
+import logging
+import re
+from typing import Iterable, List, Tuple
+
+try:
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:
+    import sre_parse
+    import sre_constants
+
+module_logger = logging.getLogger('libcord.dispatch')
+
+_named_group = re.compile(r'(?<!\\)\(\?P<\w+>')
+_default_flags = re.compile('').flags
+
+
+class RegexEntry(object):
+    """
+    one regex command with the cheap checks derived from its pattern
+    """
+    def __init__(self, prog: str, cmd, pattern):
+        self.prog = prog
+        self.cmd = cmd
+        self.pattern = pattern
+        parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+        self.min_length, self.max_length = parsed.getwidth()
+        self.ops = self._ops(parsed)
+        self.prefix = ''
+        self.required = ''
+        if not pattern.flags & re.IGNORECASE:
+            runs = self._literal_runs(list(parsed))
+            self.prefix = runs[0][1] if runs and runs[0][0] == 0 else ''
+            self.required = max((run for start, run in runs), key=len, default='')
+
+    @staticmethod
+    def _flatten(items: list) -> list:
+        # groups around literals do not make them optional, so look into them,
+        # unless the group changes flags like (?i:...), then its literals match other text
+        flat = []
+        for op, av in items:
+            if op is sre_constants.SUBPATTERN and not av[1] and not av[2]:
+                flat.extend(RegexEntry._flatten(list(av[-1])))
+            else:
+                flat.append((op, av))
+        return flat
+
+    @staticmethod
+    def _ops(items) -> set:
+        """
+        every opcode of the parsed pattern, nested ones included
+        """
+        ops = set()
+        for op, av in items:
+            ops.add(op)
+            for value in av if isinstance(av, (tuple, list)) else ():
+                # branches hold a list of subpatterns
+                for sub in value if isinstance(value, list) else [value]:
+                    if isinstance(sub, sre_parse.SubPattern):
+                        ops |= RegexEntry._ops(sub)
+        return ops
+
+    @staticmethod
+    def _literal_runs(items: list) -> List[Tuple[int, str]]:
+        """
+        (position, text) of every sequence of literal characters the pattern requires
+        """
+        runs = []
+        start, chars = 0, []
+        for index, (op, av) in enumerate(RegexEntry._flatten(items)):
+            if op is sre_constants.LITERAL:
+                if not chars:
+                    start = index
+                chars.append(chr(av))
+            elif chars:
+                runs.append((start, ''.join(chars)))
+                chars = []
+        if chars:
+            runs.append((start, ''.join(chars)))
+        return runs
+
+    def accepts(self, text: str) -> bool:
+        """
+        False if the pattern can not possibly match the text
+        """
+        return (self.min_length <= len(text) <= self.max_length
+                and text.startswith(self.prefix)
+                and self.required in text)
+
+    def combinable(self) -> bool:
+        # merging renumbers the groups, which breaks backreferences and (?(1)...) conditionals
+        return (self.pattern.flags == _default_flags
+                and not self.ops & {sre_constants.GROUPREF, sre_constants.GROUPREF_EXISTS})
+
+
+class RegexDispatcher(object):
+    """
+    all regex commands behind one combined pattern, most messages are rejected
+    by a single match without calling any command
+    """
+    def __init__(self, commands: Iterable[Tuple[str, object]]):
+        self.entries = [RegexEntry(prog, cmd, cmd.pattern) for prog, cmd in commands if cmd.pattern]
+        self.min_length = min((entry.min_length for entry in self.entries), default=0)
+        self.max_length = max((entry.max_length for entry in self.entries), default=0)
+        combinable = [entry for entry in self.entries if entry.combinable()]
+        # patterns with flags or backreferences can not be merged, they are always checked on their own
+        self.separate = [entry for entry in self.entries if not entry.combinable()]
+        self.combined = None
+        if combinable:
+            alternatives = [_named_group.sub('(?:', entry.pattern.pattern) for entry in combinable]
+            try:
+                self.combined = re.compile('|'.join(f"(?:{alternative})" for alternative in alternatives))
+            except re.error as err:
+                module_logger.warning(f"could not combine regex commands: {err}")
+                self.separate = self.entries
+        module_logger.debug(f"dispatching {len(self.entries)} regex commands, {len(self.separate)} not combined")
+
+    def candidates(self, text: str) -> List[RegexEntry]:
+        """
+        entries whose pattern may fullmatch the text, in registration order
+        """
+        if not self.entries or not self.min_length <= len(text) <= self.max_length:
+            return []
+        if self.combined is None or self.combined.fullmatch(text) is None:
+            if not self.separate:
+                return []
+            return [entry for entry in self.separate if entry.accepts(text)]
+        return [entry for entry in self.entries if entry.accepts(text)]
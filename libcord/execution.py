@@ -0,0 +1,119 @@
+import contextvars
+from contextlib import contextmanager
+import ctypes
+from io import StringIO
+import logging
+import sys
+import threading
+from typing import Callable, Any
+
+module_logger = logging.getLogger('libcord.execution')
+
+
+class CommandTimeout(Exception):
+    """
+    a command did not finish within its time limit
+    """
+
+
+class CommandCancelled(BaseException):
+    """
+    raised inside a command thread that got cancelled, a BaseException so that
+    `except Exception` in a command does not swallow it and keep the pool thread
+    """
+
+
+class CapturedOutput(StringIO):
+    """
+    output of one command execution
+    """
+    def __init__(self):
+        super().__init__()
+        self.is_help = False
+
+
+_output: contextvars.ContextVar = contextvars.ContextVar('libcord_output', default=None)
+
+
+class ContextStdout(object):
+    """
+    sys.stdout replacement that writes to the output captured by the current
+    thread or task, and to the real stdout everywhere else
+    """
+    def __init__(self, fallback):
+        self.fallback = fallback
+
+    def write(self, text: str) -> int:
+        output = _output.get()
+        if output is None:
+            return self.fallback.write(text)
+        return output.write(text)
+
+    def flush(self):
+        if _output.get() is None:
+            self.fallback.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.fallback, name)
+
+
+def current_output() -> CapturedOutput:
+    """
+    output captured in the current context, None if nothing is captured
+    """
+    return _output.get()
+
+
+@contextmanager
+def capture_output():
+    """
+    captures everything printed in the current thread or task, concurrent captures do not mix
+    """
+    if not isinstance(sys.stdout, ContextStdout):
+        sys.stdout = ContextStdout(sys.stdout)
+    output = CapturedOutput()
+    token = _output.set(output)
+    try:
+        yield output
+    finally:
+        _output.reset(token)
+
+
+class CommandJob(object):
+    """
+    one function call on the command pool that can be cancelled from the loop
+    """
+    def __init__(self, func: Callable[..., Any], *args, **kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.cancelled = False
+        self.thread_id: int = None
+        self.lock = threading.Lock()
+
+    def run(self):
+        with self.lock:
+            if self.cancelled:
+                raise CommandCancelled()
+            self.thread_id = threading.get_ident()
+        try:
+            return self.func(*self.args, **self.kwargs)
+        finally:
+            with self.lock:
+                if self.cancelled:
+                    # drop the exception if it was not delivered yet, so it cannot hit the pool thread later
+                    ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(self.thread_id), None)
+                self.thread_id = None
+
+    def cancel(self):
+        """
+        raises CommandCancelled in the thread running the job, the thread
+        notices it at its next python instruction, not inside blocking c calls,
+        work done in one c call, like multiplying a huge string, runs to its end
+        and holds its pool thread until then
+        """
+        with self.lock:
+            self.cancelled = True
+            if self.thread_id is not None:
+                module_logger.warning(f"cancelling {self.func}")
+                ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(self.thread_id), ctypes.py_object(CommandCancelled))
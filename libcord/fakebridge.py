@@ -0,0 +1,195 @@
+import asyncio
+import argparse
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, List
+
+module_logger = logging.getLogger('libcord.fakebridge')
+
+
+class FakeMatterbridge(object):
+    """
+    minimal local stand-in for the matterbridge REST api
+
+    serves GET /api/messages, POST /api/message and GET /api/stream on its own
+    event loop in a background thread, so it can be used next to the blocking
+    requests calls in LibCord without deadlocking
+    """
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, token: str = None, buffer: int = 1000, latency: float = 0.0):
+        self.host = host
+        self.port = port
+        self.token = token
+        # simulated processing time of every non streaming request
+        self.latency = latency
+        # number of upcoming posts to answer with 503
+        self.fail_posts = 0
+        self.sent: List[dict] = []
+        # time.perf_counter() at which each entry of `sent` arrived
+        self.sent_at: List[float] = []
+        self.requests: Dict[str, int] = {}
+        # like matterbridge, /api/messages and /api/stream are fed independently
+        self._buffer = deque(maxlen=buffer)
+        self._streams: List[asyncio.StreamWriter] = []
+        self._loop: asyncio.AbstractEventLoop = None
+        self._server = None
+        self._thread: threading.Thread = None
+        self._sent_cond = threading.Condition()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._server = self._loop.run_until_complete(
+                asyncio.start_server(self._handle, self.host, self.port))
+            self.port = self._server.sockets[0].getsockname()[1]
+            module_logger.info(f"fake matterbridge listening on {self.host}:{self.port}")
+            ready.set()
+            self._loop.run_forever()
+            self._server.close()
+            tasks = asyncio.all_tasks(self._loop)
+            for task in tasks:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name='fake-matterbridge', daemon=True)
+        self._thread.start()
+        ready.wait()
+
+    def stop(self):
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._close_streams)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+
+    def inject(self, text: str = None, **message):
+        """
+        queues a message as if it came from a bridged chat, thread safe
+        """
+        if text is not None:
+            message['text'] = text
+        message.setdefault('username', 'user')
+        message.setdefault('gateway', 'test')
+        self._loop.call_soon_threadsafe(self._publish, message)
+
+    def drop_streams(self):
+        """
+        closes all open /api/stream connections, thread safe
+        """
+        self._loop.call_soon_threadsafe(self._close_streams)
+
+    def wait_sent(self, count: int, timeout: float = None) -> bool:
+        """
+        blocks until at least `count` messages have been posted to /api/message
+        """
+        with self._sent_cond:
+            return self._sent_cond.wait_for(lambda: len(self.sent) >= count, timeout=timeout)
+
+    def _publish(self, message: dict):
+        self._buffer.append(message)
+        line = (json.dumps(message) + '\n').encode()
+        for writer in list(self._streams):
+            self._write_chunk(writer, line)
+
+    def _close_streams(self):
+        for writer in self._streams:
+            writer.close()
+        self._streams.clear()
+
+    @staticmethod
+    def _write_chunk(writer: asyncio.StreamWriter, data: bytes):
+        writer.write(b'%x\r\n%s\r\n' % (len(data), data))
+
+    @staticmethod
+    def _respond(writer: asyncio.StreamWriter, status: str, body: bytes = b'', content_type: str = 'application/json'):
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"\r\n".encode() + body)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode().split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, value = line.decode().split(':', 1)
+                    headers[key.strip().lower()] = value.strip()
+                body = b''
+                if 'content-length' in headers:
+                    body = await reader.readexactly(int(headers['content-length']))
+                self.requests[path] = self.requests.get(path, 0) + 1
+                if self.latency and path != '/api/stream':
+                    await asyncio.sleep(self.latency)
+
+                if self.token and headers.get('authorization') != f"Bearer {self.token}":
+                    self._respond(writer, '401 Unauthorized')
+                elif method == 'GET' and path == '/api/messages':
+                    messages = list(self._buffer)
+                    self._buffer.clear()
+                    self._respond(writer, '200 OK', json.dumps(messages).encode())
+                elif method == 'POST' and path == '/api/message' and self.fail_posts > 0:
+                    self.fail_posts -= 1
+                    self._respond(writer, '503 Service Unavailable')
+                elif method == 'POST' and path == '/api/message':
+                    with self._sent_cond:
+                        self.sent.append(json.loads(body))
+                        self.sent_at.append(time.perf_counter())
+                        self._sent_cond.notify_all()
+                    self._respond(writer, '200 OK', body)
+                elif method == 'GET' and path == '/api/stream':
+                    writer.write(
+                        b"HTTP/1.1 200 OK\r\n"
+                        b"Content-Type: application/x-ndjson\r\n"
+                        b"Transfer-Encoding: chunked\r\n"
+                        b"\r\n")
+                    self._write_chunk(writer, (json.dumps({'text': '', 'event': 'api_connected'}) + '\n').encode())
+                    self._streams.append(writer)
+                    return
+                else:
+                    self._respond(writer, '404 Not Found')
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='fakebridge', description='local fake matterbridge api')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=4242)
+    parser.add_argument('--token', default=None)
+    parser.add_argument('--latency', type=float, default=0.0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    with FakeMatterbridge(host=args.host, port=args.port, token=args.token, latency=args.latency) as bridge:
+        print(f"listening on {bridge.host}:{bridge.port}, type lines to inject messages")
+        try:
+            while True:
+                bridge.inject(input())
+        except (EOFError, KeyboardInterrupt):
+            pass
+
+
+if __name__ == '__main__':
+    main()
@@ -2,50 +2,167 @@ import git
 from pathlib import Path
 import appdirs
 import logging
+import threading
+import time
+from typing import Dict
 import yaml
 
+from .metrics import stage_seconds
+from .store import StoreBackend
+
 module_logger = logging.getLogger('libcord.gitwiki')
-#TODO: add module_logger
 
-class Gitwiki:
+class Gitwiki(StoreBackend):
     """
     Manipulates a wiki and returns urls to files
+
+    uploads are written by a background thread that batches everything
+    queued within `batch_delay` seconds into one commit and one push,
+    the wiki is only cloned or pulled once the first upload is written
     """
-    def __init__(self, url: str, web_url_base: str):
+    def __init__(self, url: str = None, web_url_base: str = None, path: str = None, batch_delay: float = 2.0, max_batch: int = 50, retry_delay: float = 10.0, offline: bool = False):
+        # absolute, the offline url base is a file uri of it
+        self.wiki_path = (Path(path) if path else self.default_path()).resolve()
+        self.offline = offline or not url
+        if self.offline:
+            web_url_base = web_url_base or self.wiki_path.as_uri()
         self.url = url
         self.web_url_base = web_url_base
-        # clone
-        dir =  appdirs.user_data_dir('pyCord', 'NikkyAI')
-        self.wiki_path = Path(dir, "wiki")
+        self.batch_delay = batch_delay
+        self.max_batch = max_batch
+        self.retry_delay = retry_delay
+        self.repo: git.Repo = None
+
+        self.pending: Dict[Path, str] = {}
+        self.writing = False
+        self.commits = 0
+        self.condition = threading.Condition()
+        self.writer = threading.Thread(target=self.write_loop, name='libcord-wiki', daemon=True)
+        self.writer.start()
+
+    @staticmethod
+    def default_path() -> Path:
+        return Path(appdirs.user_data_dir('pyCord', 'NikkyAI'), "wiki")
+
+    @staticmethod
+    def init_bare(path: Path) -> Path:
+        if not path.exists():
+            module_logger.info(f"creating local wiki repository {path}")
+            bare = git.Repo.init(path, bare=True, mkdir=True)
+            bare.git.symbolic_ref('HEAD', 'refs/heads/master')
+        return path
+
+    def prepare(self):
+        """
+        clones the wiki, or resets and pulls an existing clone
+        """
+        url = self.url
+        if self.offline:
+            # a local bare repository stands in for the remote
+            url = str(self.init_bare(self.wiki_path.with_name(self.wiki_path.name + ".git")))
         if self.wiki_path.exists() and self.wiki_path.is_dir():
             self.repo = git.Repo(self.wiki_path)
             self.reset()
         else:
+            module_logger.info(f"cloning {url} into {self.wiki_path}")
             self.repo = git.Repo.clone_from(url, self.wiki_path)
+            if not self.repo.head.is_valid():
+                self.seed()
+
+    def seed(self):
+        """
+        creates the master branch in an empty wiki
+        """
+        repo = self.repo
+        repo.git.symbolic_ref('HEAD', 'refs/heads/master')
+        home = Path(self.wiki_path, "Home.md")
+        home.write_text("# pyCord\n")
+        repo.index.add([home.name])
+        repo.index.commit("initial commit")
+        repo.git.push('--set-upstream', 'origin', 'master')
+
+    def exists(self, filename: str, is_help: bool, file_extension: str = 'md') -> bool:
+        file_path = self.file_path(filename, is_help, file_extension)
+        with self.condition:
+            if file_path in self.pending:
+                return True
+        if self.repo is None:
+            # not cloned yet, uploading again does no harm, unchanged files are not committed
+            return False
+        return Path(self.wiki_path, file_path).exists()
 
     def upload(self, filename: str, content: str, is_help: bool, file_extension: str = 'md'):
-        self.reset()
-        file_path: Path = Path(f"{filename}.{file_extension}")
-        if is_help:
-            file_path = Path("help" ,file_path)
-        full_path = Path(self.wiki_path / file_path)
-        file_dir = Path(full_path.parent)
-        file_dir.mkdir(exist_ok=True, parents=True)
-        with open(full_path, "w+") as text_file:
-            text_file.write(content)
-        # with open(full_path, "r") as text_file:
-        #     module_logger.debug(text_file.read())
-        self.repo.index.add([str(file_path)])
+        """
+        queues the content for the next commit and returns its url right away,
+        a later upload to the same file before the commit replaces this one
+        """
+        file_path = self.file_path(filename, is_help, file_extension)
+        with self.condition:
+            self.pending[file_path] = content
+            self.condition.notify_all()
+        return self.url_for(filename, is_help, file_extension)
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        blocks until everything queued so far is pushed
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.pending and not self.writing, timeout=timeout)
+
+    def write_loop(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending)
+            # give other uploads the chance to end up in the same commit
+            deadline = time.monotonic() + self.batch_delay
+            with self.condition:
+                self.condition.wait_for(lambda: len(self.pending) >= self.max_batch, timeout=max(deadline - time.monotonic(), 0))
+                batch, self.pending = self.pending, {}
+                self.writing = True
+            start = time.perf_counter()
+            try:
+                self.write(batch)
+                stage_seconds.labels('wiki_write').observe(time.perf_counter() - start)
+            except Exception as ex:
+                module_logger.exception(f"writing {len(batch)} files failed, retrying in {self.retry_delay}s")
+                with self.condition:
+                    # newer content queued in the meantime wins
+                    self.pending = {**batch, **self.pending}
+                time.sleep(self.retry_delay)
+            finally:
+                with self.condition:
+                    self.writing = False
+                    self.condition.notify_all()
+
+    def write(self, batch: Dict[Path, str]):
+        if self.repo is None:
+            self.prepare()
+        else:
+            self.reset()
+        for file_path, content in batch.items():
+            full_path = Path(self.wiki_path / file_path)
+            file_dir = Path(full_path.parent)
+            file_dir.mkdir(exist_ok=True, parents=True)
+            with open(full_path, "w+") as text_file:
+                text_file.write(content)
+        self.repo.index.add([str(file_path) for file_path in batch])
         # get names of all changed files
-        # diff = self.repo.git.diff('HEAD~1..HEAD', name_only=True)
         diff = self.repo.index.diff(self.repo.head.commit)
         if diff:
-            # for diff_entry in diff:
-            #     module_logger.debug(yaml.dump(diff_entry))
-            self.repo.index.commit(f"added {filename}")
-            self.repo.remotes.origin.push()
-        return self.web_url_base + "/" + "/".join(file_path.parts)
+            names = ", ".join(str(file_path.with_suffix('')) for file_path in batch)
+            self.repo.index.commit(f"added {names}")
+            self.commits += 1
+        # a commit whose push failed before is pushed by the retry, even without new changes
+        if self.ahead():
+            # a rejected push is only logged by GitPython, raising makes write_loop retry it
+            self.repo.remotes.origin.push().raise_if_error()
+            module_logger.debug(f"pushed {len(batch)} files")
 
+    def ahead(self) -> int:
+        """
+        commits of master not pushed to origin yet
+        """
+        return int(self.repo.git.rev_list('--count', 'origin/master..master'))
 
     def reset(self):
         repo = self.repo
@@ -58,4 +175,4 @@ class Gitwiki:
         # remove any extra non-tracked files (.pyc, etc)
         repo.git.clean('-xdf')
         # pull in the changes from from the remote
-        repo.remotes.origin.pull()
\ No newline at end of file
+        repo.remotes.origin.pull()
@@ -0,0 +1,182 @@
+import asyncio
+from collections import Counter, deque
+import itertools
+import logging
+from typing import Callable, Deque, List, Tuple
+
+from .message import Message
+from .metrics import queue_blocked_total, queue_dropped_total, queue_skipped_total
+
+module_logger = logging.getLogger('libcord.ingest')
+
+
+class _Entry(object):
+    __slots__ = ('seq', 'message', 'lane', 'command', 'queued')
+
+    def __init__(self, seq: int, message: Message, lane: int, command: bool):
+        self.seq = seq
+        self.message = message
+        self.lane = lane
+        self.command = command
+        self.queued = True
+
+
+class IngestQueue(object):
+    """
+    bounded queue between produce_message and consume_message, split into one
+    lane per consumer, a lane that is not taken from does not hold up the others,
+    `maxsize` and the overload policy apply to all lanes together
+
+    overload policies once `maxsize` messages are waiting:
+        block       the producer waits, matterbridge buffers or the stream stalls
+        drop_oldest the oldest waiting message is dropped
+        drop_noise  messages that trigger no command are dropped first, then the oldest
+        skip_regex  like block, and regex commands are not scanned while
+                    the queue is above `high_water`
+    """
+    policies = ('block', 'drop_oldest', 'drop_noise', 'skip_regex')
+
+    def __init__(self, is_command: Callable[[Message], bool], maxsize: int = 1000, policy: str = 'block', high_water: int = None, keep: int = 100, lanes: int = 1, lane_of: Callable[[Message], int] = None):
+        if policy not in self.policies:
+            raise ValueError(f"unknown queue policy '{policy}', choose one of {self.policies}")
+        self.is_command = is_command
+        self.maxsize = max(1, maxsize)
+        self.policy = policy
+        self.high_water = high_water if high_water is not None else int(self.maxsize * 0.8)
+        self.lane_of = lane_of or (lambda message: 0)
+        self.lanes: List[Deque[_Entry]] = [deque() for _ in range(max(1, lanes))]
+        self.size = 0
+        self.counter = itertools.count()
+        # noise entries in arrival order for drop_noise, taken ones are skipped when met
+        self.noise: Deque[_Entry] = deque()
+        self.not_empty = [asyncio.Event() for _ in self.lanes]
+        self.any_not_empty = asyncio.Event()
+        self.not_full = asyncio.Event()
+        self.dropped = Counter()
+        self.skipped = Counter()
+        self.blocked = 0
+        # the most recently dropped or skipped messages with the reason
+        self.recent: Deque[Tuple[str, Message]] = deque(maxlen=keep)
+        # called with every dropped message, the spool marks them as done
+        self.on_drop: Callable[[Message], None] = None
+
+    def qsize(self) -> int:
+        return self.size
+
+    def empty(self) -> bool:
+        return not self.size
+
+    def full(self) -> bool:
+        return self.size >= self.maxsize
+
+    def record(self, counter: Counter, reason: str, message: Message):
+        counter[reason] += 1
+        self.recent.append((reason, message))
+        if module_logger.isEnabledFor(logging.DEBUG):
+            module_logger.debug(f"{reason}: {message.gateway} {message.username}")
+
+    def drop(self, reason: str, message: Message):
+        self.record(self.dropped, reason, message)
+        queue_dropped_total.labels(reason).inc()
+        if self.on_drop:
+            self.on_drop(message)
+
+    def remove(self, entry: _Entry):
+        if self.lanes[entry.lane][0] is entry:
+            self.lanes[entry.lane].popleft()
+        else:
+            self.lanes[entry.lane].remove(entry)
+        entry.queued = False
+        self.size -= 1
+
+    def oldest(self) -> _Entry:
+        return min((lane[0] for lane in self.lanes if lane), key=lambda entry: entry.seq)
+
+    def oldest_noise(self) -> _Entry:
+        while self.noise:
+            entry = self.noise.popleft()
+            if entry.queued:
+                return entry
+        return None
+
+    async def put(self, message: Message):
+        # classified once here, drop_noise looks at the flag instead of scanning again
+        command = self.is_command(message) if self.policy == 'drop_noise' else True
+        if self.full():
+            if self.policy in ('block', 'skip_regex'):
+                self.blocked += 1
+                queue_blocked_total.labels().inc()
+                while self.full():
+                    self.not_full.clear()
+                    await self.not_full.wait()
+            elif self.policy == 'drop_noise' and not command:
+                self.drop('noise', message)
+                return
+            elif self.policy == 'drop_noise':
+                noise = self.oldest_noise()
+                if noise is not None:
+                    self.remove(noise)
+                    self.drop('noise', noise.message)
+                else:
+                    oldest = self.oldest()
+                    self.remove(oldest)
+                    self.drop('oldest', oldest.message)
+            else:
+                oldest = self.oldest()
+                self.remove(oldest)
+                self.drop('oldest', oldest.message)
+        lane = self.lane_of(message)
+        entry = _Entry(next(self.counter), message, lane, command)
+        self.lanes[lane].append(entry)
+        if not command:
+            self.noise.append(entry)
+        self.size += 1
+        self.not_empty[lane].set()
+        self.any_not_empty.set()
+
+    def taken(self, entry: _Entry) -> Message:
+        entry.queued = False
+        self.size -= 1
+        # taken noise at the front is of no use to drop_noise anymore
+        while self.noise and not self.noise[0].queued:
+            self.noise.popleft()
+        self.not_full.set()
+        return entry.message
+
+    async def get(self, lane: int = None) -> Message:
+        """
+        the next message of a lane, or the oldest of all lanes without one
+        """
+        if lane is None:
+            while not self.size:
+                self.any_not_empty.clear()
+                await self.any_not_empty.wait()
+            entry = self.oldest()
+            self.lanes[entry.lane].popleft()
+            return self.taken(entry)
+        entries = self.lanes[lane]
+        while not entries:
+            self.not_empty[lane].clear()
+            await self.not_empty[lane].wait()
+        return self.taken(entries.popleft())
+
+    def skip_regex(self, message: Message) -> bool:
+        """
+        True if the regex scan of a message is to be skipped because of the backlog
+        """
+        if self.policy == 'skip_regex' and self.size >= self.high_water:
+            self.record(self.skipped, 'regex', message)
+            queue_skipped_total.labels('regex').inc()
+            return True
+        return False
+
+    def stats(self) -> dict:
+        return {
+            'depth': self.size,
+            'maxsize': self.maxsize,
+            'policy': self.policy,
+            'blocked': self.blocked,
+            'dropped': dict(self.dropped),
+            'skipped': dict(self.skipped),
+            'lanes': [len(lane) for lane in self.lanes],
+        }
@@ -1,30 +1,184 @@
+import asyncio
 import sys
 from libcord import LibCord
 from .modules import modules
-from importlib import reload, import_module
+from importlib import import_module, util
 import logging
+from pathlib import Path
+import threading
+from typing import Dict, List
+import yaml
 
 module_logger = logging.getLogger('libcord.loader')
 
+manifest_path = Path(Path(__file__).parent, 'modules', 'manifest.yaml')
+
 class ModLoader():
-    def __init__(self, cord: LibCord):
+    """
+    imports the command modules, with `lazy` a module is only imported on the
+    first use of one of its commands, its command names are read from the manifest,
+    with `watch` loaded modules are reloaded when their file changes
+    """
+    def __init__(self, cord: LibCord, load: List[str] = None, exclude: List[str] = (), lazy: bool = False, manifest: str = None, watch: float = None):
         self.cord = cord
+        self.watch = watch
+        for module in [*(load or []), *exclude]:
+            if module not in modules:
+                module_logger.warning(f"unknown module '{module}' in config")
+        self.enabled = [module for module in (modules if load is None else load) if module in modules and module not in exclude]
+        self.lazy = lazy
+        self.manifest: Dict[str, dict] = {}
+        if lazy:
+            self.manifest = self.read_manifest(Path(manifest) if manifest else manifest_path)
+        # command name -> module of every command whose module is not imported yet
+        self.pending: Dict[str, str] = {}
+        # command names registered by every loaded module
+        self.commands: Dict[str, List[str]] = {}
+        # modules are loaded from command threads as well
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def read_manifest(path: Path) -> Dict[str, dict]:
+        try:
+            with open(path) as f:
+                return yaml.safe_load(f) or {}
+        except FileNotFoundError:
+            module_logger.warning(f"no module manifest at {path}, loading all modules")
+            return {}
 
     def load_all(self):
-        for mod in modules:
+        for mod in self.enabled:
+            entry = self.manifest.get(mod)
+            # regex commands have to be known up front to be dispatched
+            if entry and not entry.get('regex'):
+                for name in entry['commands']:
+                    self.pending[name] = mod
+                continue
             self.load(mod)
+        if self.pending:
+            module_logger.info(f"{len(set(self.pending.values()))} modules are loaded on first use")
+
+    def load_for(self, name: str) -> bool:
+        """
+        imports the module of a command that is not loaded yet, False if there is none
+        """
+        module = self.pending.get(name)
+        if module is None:
+            return False
+        with self.lock:
+            # another thread may have loaded it while this one waited
+            if self.pending.get(name) == module:
+                module_logger.info(f"loading {module} for '{name}'")
+                self.load(module)
+        return True
+
+    def pending_modules(self) -> Dict[str, List[str]]:
+        """
+        command names of every module that is not imported yet
+        """
+        pending: Dict[str, List[str]] = {}
+        for name, module in list(self.pending.items()):
+            pending.setdefault(module, []).append(name)
+        return pending
 
     def load(self, module: str):
         assert(module in modules)
         module_logger.debug(f"load('{module}')")
         _basename = 'libcord.modules.{}'.format(module)
-        mod = import_module(_basename)
-        mod.init(self.cord)
-    
+        with self.lock:
+            mod = import_module(_basename)
+            self.init(module, mod)
+
     def reload(self, module: str):
+        """
+        imports a module again into a fresh module object and swaps its new handlers in,
+        if importing or initializing it fails the previous version stays in use untouched
+        """
         assert(module in modules)
+        if module not in self.enabled:
+            raise ValueError(f"module '{module}' is not enabled")
         module_logger.debug(f"reload('{module}')")
         _basename = 'libcord.modules.{}'.format(module)
-        mod = sys.modules[_basename]
-        reload(mod)
-        mod.init(self.cord)
+        with self.lock:
+            if _basename not in sys.modules:
+                self.load(module)
+                return
+            try:
+                # importlib.reload would run the new code in the globals of the running version
+                spec = util.spec_from_file_location(_basename, self.module_file(module))
+                mod = util.module_from_spec(spec)
+                spec.loader.exec_module(mod)
+                self.init(module, mod)
+            except Exception:
+                module_logger.exception(f"reloading {module} failed, keeping the previous version")
+                raise
+            sys.modules[_basename] = mod
+            setattr(sys.modules['libcord.modules'], module, mod)
+
+    def module_file(self, module: str) -> Path:
+        return Path(Path(__file__).parent, 'modules', f"{module}.py")
+
+    async def watch_modules(self):
+        """
+        polls the files of the loaded modules every `watch` seconds and reloads changed ones
+        """
+        loop = asyncio.get_event_loop()
+        mtimes: Dict[str, float] = {}
+        while True:
+            for module in list(self.commands):
+                try:
+                    mtime = self.module_file(module).stat().st_mtime
+                except FileNotFoundError:
+                    continue
+                known = mtimes.setdefault(module, mtime)
+                if mtime != known:
+                    mtimes[module] = mtime
+                    module_logger.info(f"{module} changed, reloading")
+                    try:
+                        await loop.run_in_executor(None, self.reload, module)
+                    except Exception:
+                        # logged by reload, the previous version stays in use
+                        pass
+            await asyncio.sleep(self.watch)
+
+    def init(self, module: str, mod):
+        handlers = dict(self.cord.cmd_handlers)
+        with self.cord.stage_commands():
+            mod.init(self.cord)
+        created = [name for name, handler in self.cord.cmd_handlers.items() if handlers.get(name) is not handler]
+        self.commands[module] = sorted(name for name, owner in self.cord.registry.owners.items() if owner in created)
+        self.pending = {name: pending for name, pending in self.pending.items() if pending != module}
+        entry = self.manifest.get(module)
+        if entry and sorted(entry['commands']) != self.commands[module]:
+            module_logger.warning(f"manifest of {module} is out of date, regenerate it with python -m libcord.loader")
+        self.cord.render_help()
+
+    def build_manifest(self) -> Dict[str, dict]:
+        """
+        the manifest of all loaded modules
+        """
+        manifest = {}
+        for module, names in self.commands.items():
+            regex = any(self.cord.registry.lookup(name).pattern for name in names)
+            manifest[module] = {'commands': names, 'regex': regex}
+        return manifest
+
+
+def main():
+    """
+    imports every module and writes their command names to libcord/modules/manifest.yaml
+    """
+    import tempfile
+    logging.basicConfig(level=logging.ERROR)
+    cord = LibCord(username='manifest', store={'backend': 'local', 'path': tempfile.mkdtemp(prefix='pycord-manifest-')})
+    cord.loader.load_all()
+    manifest = cord.loader.build_manifest()
+    with open(manifest_path, 'w') as f:
+        f.write("# command names of every module, lets the loader import modules on first use\n")
+        f.write("# generated by python -m libcord.loader, regenerate it after adding or renaming commands\n")
+        yaml.safe_dump(manifest, f, default_flow_style=None, sort_keys=True)
+    print(f"wrote {len(manifest)} modules to {manifest_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,21 @@
 import datetime
-import yaml
+import json
+import re
+from typing import Dict, List
+
+# matterbridge sends nanoseconds, datetime takes up to microseconds
+_fraction = re.compile(r'(\.\d{6})\d+')
 
 class Message(object):
 
 # {'text': '!test --help', 'channel': 'bridge-test', 'username': 'Nikky', 'avatar': 'https://cdn.discordapp.com/avatars/11222862436
 # 6575616/6c8d3b490bd3e56afc2b2e191f9c0767.jpg', 'account': 'discord.teamdev', 'event': '', 'protocol': 'discord', 'gateway': 'test
 # 2', 'timestamp': '2017-06-06T22:26:08.759413856+02:00'}
-    def __init__(self, text: str, channel: str = None, username: str = None, avatar: str = None, account: str = None, event: str = None, protocol: str = None, gateway: str = None, timestamp: datetime = None):
+    fields = ('text', 'channel', 'username', 'avatar', 'account', 'event', 'protocol', 'gateway', 'timestamp')
+    # __weakref__ lets the tracer remember sampled messages without keeping them alive
+    __slots__ = fields + ('_time', '__weakref__')
+
+    def __init__(self, text: str, channel: str = None, username: str = None, avatar: str = None, account: str = None, event: str = None, protocol: str = None, gateway: str = None, timestamp: str = None):
         self.text = text
         self.channel = channel
         self.username = username
@@ -15,13 +24,77 @@ class Message(object):
         self.event = event
         self.protocol = protocol
         self.gateway = gateway
+        # kept as sent by matterbridge, `time` parses it when it is needed
         self.timestamp = timestamp
+        self._time = None
+
+    @classmethod
+    def from_dict(cls, message_dict: dict, shared: Dict[str, str] = None) -> 'Message':
+        """
+        builds a message from decoded json, unknown keys are ignored,
+        strings also found in `shared` are replaced by the shared instance
+        """
+        message = cls.__new__(cls)
+        get = message_dict.get
+        if shared is None:
+            message.text = get('text')
+            message.channel = get('channel')
+            message.username = get('username')
+            message.avatar = get('avatar')
+            message.account = get('account')
+            message.event = get('event')
+            message.protocol = get('protocol')
+            message.gateway = get('gateway')
+        else:
+            share = shared.setdefault
+            message.text = get('text')
+            message.channel = share(get('channel'), get('channel'))
+            message.username = share(get('username'), get('username'))
+            message.avatar = share(get('avatar'), get('avatar'))
+            message.account = share(get('account'), get('account'))
+            message.event = share(get('event'), get('event'))
+            message.protocol = share(get('protocol'), get('protocol'))
+            message.gateway = share(get('gateway'), get('gateway'))
+        message.timestamp = get('timestamp')
+        message._time = None
+        return message
+
+    def as_dict(self) -> dict:
+        """
+        every field that is set, as sent to matterbridge
+        """
+        return {field: getattr(self, field) for field in self.fields if getattr(self, field)}
+
+    @property
+    def time(self) -> datetime.datetime:
+        """
+        timestamp parsed on first use, None if there is none or it can not be parsed
+        """
+        if self._time is None and self.timestamp:
+            timestamp = _fraction.sub(r'\1', self.timestamp.replace('Z', '+00:00'))
+            try:
+                self._time = datetime.datetime.fromisoformat(timestamp)
+            except ValueError:
+                pass
+        return self._time
 
     def __repr__(self):
-        return yaml.dump(self, default_flow_style=True)
+        return f"Message(gateway={self.gateway!r}, username={self.username!r}, text={self.text!r})"
 
     def create_response(self, response: str):
         #TODO: append original username in front of message string?
         response_message = Message(text = response, gateway = self.gateway)
         # self.libcord.send(response_message)
-        return response_message
\ No newline at end of file
+        return response_message
+
+
+def decode_messages(body: bytes) -> List[Message]:
+    """
+    decodes a whole /api/messages response, the channel, user and gateway
+    strings repeated throughout a batch are stored once
+    """
+    if not body:
+        return []
+    shared: Dict[str, str] = {}
+    from_dict = Message.from_dict
+    return [from_dict(message_dict, shared) for message_dict in json.loads(body)]
@@ -0,0 +1,208 @@
+from bisect import bisect_left
+from functools import partial
+import http.server
+import logging
+import threading
+from typing import Callable, Dict, List, Tuple
+
+module_logger = logging.getLogger('libcord.metrics')
+
+
+class Counter(object):
+    def __init__(self):
+        self.value = 0
+        # incremented from the loop, the command pool and the writer threads
+        self.lock = threading.Lock()
+
+    def inc(self, value: float = 1):
+        with self.lock:
+            self.value += value
+
+
+class Histogram(object):
+    """
+    latency histogram with fixed buckets in seconds, observing is a bisect and two additions
+    """
+    buckets = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        """
+        counts, sum and count of one moment, for rendering while other threads observe
+        """
+        with self.lock:
+            return list(self.counts), self.sum, self.count
+
+    def percentile(self, p: float) -> float:
+        """
+        upper bound of the bucket holding the p-th percentile
+        """
+        if not self.count:
+            return 0.0
+        rank = self.count * p / 100
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class Family(object):
+    """
+    one metric with a child per value of its label
+    """
+    def __init__(self, kind: type, name: str, description: str, label: str = None):
+        self.kind = kind
+        self.name = name
+        self.description = description
+        self.label = label
+        self.children: Dict[str, object] = {}
+        self.lock = threading.Lock()
+
+    def labels(self, value: str = None):
+        child = self.children.get(value)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(value, self.kind())
+        return child
+
+    def sorted_children(self) -> List[Tuple[str, object]]:
+        # copied under the lock, labels() may add a child while the dict is iterated
+        with self.lock:
+            children = list(self.children.items())
+        return sorted(children, key=lambda item: str(item[0]))
+
+
+class Metrics(object):
+    """
+    counters, histograms and gauges of the bot, gauges are only computed when read,
+    the registry is shared by all LibCord instances of a process, so gauges are labelled
+    with the instance they belong to
+    """
+    def __init__(self):
+        self.families: Dict[str, Family] = {}
+        # name -> description and the function of every instance
+        self.gauges: Dict[str, Tuple[str, Dict[str, Callable[[], float]]]] = {}
+        self.lock = threading.Lock()
+        self.server = None
+
+    def counter(self, name: str, description: str, label: str = None) -> Family:
+        return self.families.setdefault(name, Family(Counter, name, description, label))
+
+    def histogram(self, name: str, description: str, label: str = None) -> Family:
+        return self.families.setdefault(name, Family(Histogram, name, description, label))
+
+    def gauge(self, name: str, description: str, func: Callable[[], float], instance: str = None):
+        with self.lock:
+            self.gauges.setdefault(name, (description, {}))[1][instance] = func
+
+    def gauge_values(self) -> List[Tuple[str, str, List[Tuple[str, float]]]]:
+        """
+        name, description and the value of every instance of each gauge
+        """
+        with self.lock:
+            gauges = [(name, description, list(funcs.items())) for name, (description, funcs) in self.gauges.items()]
+        return [(name, description, [(instance, func()) for instance, func in sorted(funcs, key=lambda item: str(item[0]))])
+                for name, description, funcs in gauges]
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+        for family in list(self.families.values()):
+            kind = 'counter' if family.kind is Counter else 'histogram'
+            lines.append(f"# HELP {family.name} {family.description}")
+            lines.append(f"# TYPE {family.name} {kind}")
+            for value, child in family.sorted_children():
+                label = f'{family.label}="{value}"' if family.label and value is not None else ''
+                labels = f"{{{label}}}" if label else ''
+                if family.kind is Counter:
+                    lines.append(f"{family.name}{labels} {child.value}")
+                    continue
+                counts, total, count = child.snapshot()
+                cumulative = 0
+                for bound, bucket_count in zip(child.buckets + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{family.name}_bucket{{{label + "," if label else ""}le="{le}"}} {cumulative}')
+                lines.append(f"{family.name}_sum{labels} {total}")
+                lines.append(f"{family.name}_count{labels} {count}")
+        for name, description, values in self.gauge_values():
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} gauge")
+            for instance, value in values:
+                labels = f'{{instance="{instance}"}}' if instance is not None else ''
+                lines.append(f"{name}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        """
+        human readable overview for the stats command
+        """
+        lines: List[str] = []
+        for name, description, values in self.gauge_values():
+            for instance, value in values:
+                lines.append(f"{name}: {value}" if instance is None else f"{name} {instance}: {value}")
+        for family in list(self.families.values()):
+            if not family.children:
+                continue
+            lines.append(family.name.upper())
+            for value, child in family.sorted_children():
+                if family.kind is Counter:
+                    lines.append(f"\t{value}: {child.value}")
+                else:
+                    mean = child.sum / child.count * 1000 if child.count else 0.0
+                    lines.append(f"\t{value}: n={child.count} mean={mean:.1f}ms p50<={child.percentile(50) * 1000:g}ms p99<={child.percentile(99) * 1000:g}ms")
+        return "\n".join(lines)
+
+    def serve(self, port: int, host: str = '127.0.0.1'):
+        """
+        serves the prometheus text format on http://host:port/metrics
+        """
+        self.server = http.server.ThreadingHTTPServer((host, port), partial(_MetricsRequestHandler, self))
+        threading.Thread(target=self.server.serve_forever, name='libcord-metrics', daemon=True).start()
+        module_logger.info(f"serving metrics on http://{host}:{self.server.server_address[1]}/metrics")
+
+
+class _MetricsRequestHandler(http.server.BaseHTTPRequestHandler):
+    def __init__(self, registry: Metrics, *args, **kwargs):
+        self.registry = registry
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        if self.path != '/metrics':
+            self.send_error(404)
+            return
+        body = self.registry.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args):
+        module_logger.debug(format % args)
+
+
+metrics = Metrics()
+
+stage_seconds = metrics.histogram('libcord_stage_seconds', "time spent per message handling stage", 'stage')
+command_seconds = metrics.histogram('libcord_command_seconds', "time spent per command", 'command')
+commands_total = metrics.counter('libcord_commands_total', "commands executed", 'command')
+messages_total = metrics.counter('libcord_messages_total', "messages received", 'source')
+send_total = metrics.counter('libcord_send_total', "outbound messages by result", 'result')
+queue_dropped_total = metrics.counter('libcord_queue_dropped_total', "messages dropped by the ingest queue overload policy", 'reason')
+queue_skipped_total = metrics.counter('libcord_queue_skipped_total', "regex scans skipped because of the ingest backlog", 'reason')
+queue_blocked_total = metrics.counter('libcord_queue_blocked_total', "times the producer waited for a full ingest queue")
+limited_total = metrics.counter('libcord_limited_total', "commands not run because of rate limits", 'reason')
@@ -16,39 +16,56 @@ def init(cord: LibCord):
         """
         lists all registered commands.
         """
-        for group, cmd_group in cord.cmd_handlers.items():
-            print(group.upper())
-            for key, cmd in cmd_group.cmd_map.items():
-                desc = ""
-                if cmd.parser.description:
-                    desc = ": " +cmd.parser.description
-                print(f"\t{key}{desc}")
+        print(cord.command_listing())
 
     @core.register("help")
     def help_function(command: str):
         """
         lists all registered commands.
         """
-        cmd: Command = None
-        for handler_name, cmd_handler in cord.cmd_handlers.items():
-            if command in cmd_handler.cmd_map:
-                cmd = cmd_handler.cmd_map[command]
-                break
+        help_text = cord.help_text(command)
 
-        if not cmd:
+        if help_text is None:
             print(f"no function {command} found")
             return
 
-        cmd.parser.print_help();
+        print(help_text)
         return ResultType.HELP
 
+    @core.register("stats")
+    def stats_function():
+        """
+        shows timings, counters and queue depths.
+        """
+        print(cord.metrics.summary())
+        queue = cord.q.stats()
+        print("INGEST QUEUE")
+        print(f"\t{queue['depth']}/{queue['maxsize']} waiting ({queue['policy']}), lanes {queue['lanes']}, producer blocked {queue['blocked']} times")
+        for reason, count in queue['dropped'].items():
+            print(f"\tdropped {reason}: {count}")
+        for reason, count in queue['skipped'].items():
+            print(f"\tskipped {reason}: {count}")
+        cache_stats = cord.cache_stats()
+        if cache_stats:
+            print("RESULT CACHE")
+            for name, stats in cache_stats.items():
+                print(f"\t{name}: {stats['hit_rate']:.0%} hits of {stats['hits'] + stats['misses']} calls, {stats['size']} kept, {stats['evictions']} evicted")
+        if cord.spool:
+            spool = cord.spool.stats()
+            print("SPOOL")
+            print(f"\t{spool['outstanding']} not handled, {spool['syncs']} fsyncs, {spool['compactions']} compactions, {spool['resumed']} resumed on start")
+
     @core.register("reload")
     def reload_function(user: AuthUser, module: str):
         """
         reloads a module.
         """
         if user and user.username == 'Nikky#4527':
-            cord.loader.reload(module)
+            try:
+                cord.loader.reload(module)
+            except Exception as ex:
+                print(f"reloading {module} failed, keeping the previous version: {ex!r}")
+                return
             print(f"reloaded {module}")
         else:
             print('not authorized')
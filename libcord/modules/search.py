@@ -4,6 +4,7 @@ def init(cord: LibCord):
     search: CommandHandler = cord.create_handler('search')
 
     @search.register("g")
+    @search.cache(ttl=300, maxsize=256)
     def google(s: str):
         """google something"""
         print(f"google {s} v4")
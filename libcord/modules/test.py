@@ -1,5 +1,6 @@
 from libcord import LibCord, Message, CommandHandler, CommandContext
 from libcord.authenticator import AuthUser
+import asyncio
 import yaml
 import re
 import random
@@ -29,12 +30,25 @@ def init(cord: LibCord):
         """test the docstring."""
         print(f"testing defaults = number: { number }, something = { something }, val = {val}")
 
-    @test.register("m")
+    @test.register("m", limit='expensive')
     def test_multiline(i: int):
         """test multiline output."""
         print(f"testing multiline")
         print("\nnewline"*i)
 
+    @test.register("sleep")
+    async def test_async(seconds: float = 1.0):
+        """test async commands, waits without holding a command thread"""
+        await asyncio.sleep(seconds)
+        return f"slept {seconds}s"
+
+    @test.register("countdown")
+    async def test_async_lines(n: int = 3):
+        """test async generator output"""
+        for i in range(n, 0, -1):
+            yield str(i)
+            await asyncio.sleep(0.1)
+
     @test.register("identify")
     def test_auth(user: AuthUser):
         """test nickserv identify"""
@@ -46,7 +60,7 @@ def init(cord: LibCord):
         # user: AuthUser = cord.auth.identify(name=context.message.username, account=context.message.account)
 
         # print(yaml.dump(user))@test.register("identify")
-    @test.register('dice')
+    @test.register('dice', limit='expensive')
     @test.regex(r'(?P<a>\d+)dd(?P<b>\d+)')
     def test_regex(text: str, a, b):
         #TODO: add text: str argument
@@ -0,0 +1,129 @@
+import asyncio
+from collections import deque
+import logging
+import random
+from time import perf_counter
+from typing import Deque, Dict, List, Tuple
+
+from .metrics import stage_seconds, send_total
+from .ratelimit import TokenBucket
+from .transport import Transport
+
+module_logger = logging.getLogger('libcord.outbound')
+
+
+class Outbox(object):
+    """
+    queues outgoing messages per gateway, posts them in order under a token bucket
+    per gateway, merges short replies that piled up and retries failed posts
+    """
+    def __init__(self, transport: Transport, rate: float = 1.0, burst: float = 5, coalesce: bool = True, coalesce_max: int = 1500, retries: int = 3, backoff: float = 0.5, backoff_max: float = 10.0, max_queue: int = 100, max_in_flight: int = 10):
+        self.transport = transport
+        self.rate = rate
+        self.burst = burst
+        self.coalesce = coalesce
+        self.coalesce_max = coalesce_max
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.max_queue = max_queue
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.lanes: Dict[str, Deque[Tuple[dict, asyncio.Future]]] = {}
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.workers: Dict[str, asyncio.Future] = {}
+        self.sent = 0
+        self.coalesced = 0
+        self.retried = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def put(self, payload: dict) -> asyncio.Future:
+        """
+        queues a payload for its gateway, the returned future is True once it is posted
+        and False if it was dropped or failed for good
+        """
+        gateway = payload.get('gateway')
+        future = asyncio.get_event_loop().create_future()
+        lane = self.lanes.setdefault(gateway, deque())
+        if len(lane) >= self.max_queue:
+            old_payload, old_future = lane.popleft()
+            self.dropped += 1
+            send_total.labels('dropped').inc()
+            module_logger.warning(f"outbound queue of {gateway} full, dropped {old_payload}")
+            if not old_future.done():
+                old_future.set_result(False)
+        lane.append((payload, future))
+        if gateway not in self.workers:
+            self.workers[gateway] = asyncio.ensure_future(self.drain(gateway, lane))
+        return future
+
+    def depth(self) -> int:
+        return sum(len(lane) for lane in self.lanes.values())
+
+    def stats(self) -> dict:
+        return {
+            'queued': self.depth(),
+            'sent': self.sent,
+            'coalesced': self.coalesced,
+            'retried': self.retried,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'gateways': {gateway: len(lane) for gateway, lane in self.lanes.items() if lane},
+        }
+
+    def mergeable(self, batch: List[dict], payload: dict) -> bool:
+        first = batch[0]
+        if any(payload.get(key) != first.get(key) for key in set(first) | set(payload) if key != 'text'):
+            return False
+        # attachment-only replies carry no text
+        length = sum(len(item.get('text', '')) + 1 for item in batch) + len(payload.get('text', ''))
+        return length <= self.coalesce_max
+
+    async def drain(self, gateway: str, lane: Deque[Tuple[dict, asyncio.Future]]):
+        bucket = self.buckets.get(gateway)
+        if bucket is None:
+            bucket = self.buckets[gateway] = TokenBucket(self.rate, self.burst)
+        try:
+            while lane:
+                await bucket.acquire()
+                batch, futures = [], []
+                while lane and (not batch or (self.coalesce and self.mergeable(batch, lane[0][0]))):
+                    payload, future = lane.popleft()
+                    batch.append(payload)
+                    futures.append(future)
+                payload = batch[0]
+                if len(batch) > 1:
+                    payload = {**payload, 'text': "\n".join(item.get('text', '') for item in batch)}
+                    self.coalesced += len(batch) - 1
+                posted = await self.post(payload)
+                for future in futures:
+                    if not future.done():
+                        future.set_result(posted)
+        finally:
+            del self.workers[gateway]
+            if not lane:
+                del self.lanes[gateway]
+
+    async def post(self, payload: dict) -> bool:
+        for attempt in range(self.retries + 1):
+            try:
+                async with self.slots:
+                    start = perf_counter()
+                    await self.transport.post_message(payload)
+                    stage_seconds.labels('send').observe(perf_counter() - start)
+                self.sent += 1
+                send_total.labels('sent').inc()
+                return True
+            except Exception as ex:
+                if attempt == self.retries:
+                    break
+                self.retried += 1
+                send_total.labels('retried').inc()
+                delay = min(self.backoff * 2 ** attempt, self.backoff_max)
+                delay = random.uniform(delay / 2, delay)
+                module_logger.warning(f"sending to {payload.get('gateway')} failed ({ex}), retry in {delay:.2f}s")
+                await asyncio.sleep(delay)
+        self.failed += 1
+        send_total.labels('failed').inc()
+        module_logger.error(f"sending {payload} failed after {self.retries} retries")
+        return False
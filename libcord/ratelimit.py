@@ -0,0 +1,122 @@
+import asyncio
+from collections import Counter, OrderedDict
+import logging
+from time import monotonic
+from typing import Dict, Iterable
+
+module_logger = logging.getLogger('libcord.ratelimit')
+
+class TokenBucket(object):
+    """
+    allows `rate` actions per second on average and bursts of up to `burst`,
+    a rate of 0 or None never limits
+    """
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.tokens = self.burst
+        self.updated = monotonic()
+
+    def refill(self):
+        now = monotonic()
+        if self.rate:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        if not self.rate:
+            return True
+        self.refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def delay(self, tokens: float = 1.0) -> float:
+        """
+        seconds until `tokens` are available
+        """
+        if not self.rate:
+            return 0.0
+        self.refill()
+        return max(tokens - self.tokens, 0.0) / self.rate
+
+    async def acquire(self, tokens: float = 1.0):
+        while not self.try_acquire(tokens):
+            await asyncio.sleep(self.delay(tokens))
+
+
+class RateLimiter(object):
+    """
+    token buckets per user and per user and command class, and suppression of
+    identical commands a user repeats in one gateway within `duplicate_window` seconds
+
+    a command picks its class with the `limit` option of CommandHandler.register,
+    either the name of a class or its own (rate, burst)
+    """
+    def __init__(self, user: dict = None, classes: Dict[str, dict] = None, duplicate_window: float = 2.0, max_keys: int = 10000):
+        self.user = {'rate': 1.0, 'burst': 5, **(user or {})}
+        self.classes = {'default': {'rate': 0.5, 'burst': 3}, **(classes or {})}
+        self.duplicate_window = duplicate_window
+        self.max_keys = max_keys
+        self.buckets: 'OrderedDict[tuple, TokenBucket]' = OrderedDict()
+        self.recent: 'OrderedDict[tuple, float]' = OrderedDict()
+        self.limited = Counter()
+
+    @staticmethod
+    def identity(user, username: str, account: str) -> str:
+        """
+        the identified user, or the raw name of an unidentified one
+        """
+        if user is not None:
+            return f"{user.account}/{user.id}"
+        return f"{account}/{username}"
+
+    def bucket(self, key: tuple, rate: float, burst: float) -> TokenBucket:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(rate, burst)
+            if len(self.buckets) > self.max_keys:
+                # the least recently used bucket is most likely full again anyway
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+        return bucket
+
+    def command_bucket(self, identity: str, cmd) -> TokenBucket:
+        limit = getattr(cmd, 'limit', None) or 'default'
+        if isinstance(limit, str):
+            budget = self.classes.get(limit)
+            if budget is None:
+                module_logger.warning(f"unknown rate limit class '{limit}', using default")
+                limit, budget = 'default', self.classes['default']
+            return self.bucket(('class', identity, limit), budget['rate'], budget.get('burst', 1))
+        rate, burst = limit
+        return self.bucket(('command', identity, cmd.prog), rate, burst)
+
+    def allow(self, identity: str, gateway: str, text: str, commands: Iterable = ()) -> str:
+        """
+        None if the commands may run, otherwise why not: duplicate or rate,
+        tokens are only taken when all buckets have one
+        """
+        now = monotonic()
+        recent = self.recent
+        while recent and next(iter(recent.values())) < now - self.duplicate_window:
+            recent.popitem(last=False)
+        # two users sending the same text get their own replies, commands may depend on the user
+        key = (identity, gateway, text)
+        if key in recent:
+            self.limited['duplicate'] += 1
+            return 'duplicate'
+        buckets = [self.bucket(('user', identity), self.user['rate'], self.user.get('burst', 1))]
+        buckets.extend(self.command_bucket(identity, cmd) for cmd in commands if cmd is not None)
+        if any(bucket.delay() > 0 for bucket in buckets):
+            self.limited['rate'] += 1
+            return 'rate'
+        for bucket in buckets:
+            bucket.try_acquire()
+        recent[key] = now
+        return None
+
+    def stats(self) -> dict:
+        return {'limited': dict(self.limited), 'buckets': len(self.buckets)}
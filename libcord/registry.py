@@ -0,0 +1,73 @@
+import logging
+from typing import Dict, List, Tuple
+
+module_logger = logging.getLogger('libcord.registry')
+
+
+class CommandRegistry(object):
+    """
+    every command name and alias of every handler, resolving a name is one dict lookup
+    """
+    def __init__(self):
+        self.commands: Dict[str, 'Command'] = {}
+        self.owners: Dict[str, str] = {}
+        self.aliases: Dict[str, str] = {}
+        self.collisions: List[Tuple[str, str, str]] = []
+
+    def copy(self) -> 'CommandRegistry':
+        registry = CommandRegistry()
+        registry.commands = dict(self.commands)
+        registry.owners = dict(self.owners)
+        registry.aliases = dict(self.aliases)
+        registry.collisions = list(self.collisions)
+        return registry
+
+    def add(self, handler_name: str, prog: str, cmd: 'Command', aliases: List[str] = ()) -> bool:
+        """
+        registers a command and its aliases for a handler,
+        names already taken by another handler are kept by that handler and reported,
+        registering a prog again replaces its previous aliases
+        """
+        stale = [name for name, target in self.aliases.items()
+                 if target == prog and self.owners.get(name) == handler_name and name not in aliases]
+        for name in stale:
+            del self.commands[name]
+            del self.owners[name]
+            del self.aliases[name]
+        added = True
+        for name in [prog, *aliases]:
+            owner = self.owners.get(name)
+            if owner is not None and owner != handler_name:
+                module_logger.error(f"command '{name}' of handler '{handler_name}' collides with handler '{owner}', keeping '{owner}'")
+                self.collisions.append((name, handler_name, owner))
+                added = False
+                continue
+            self.commands[name] = cmd
+            self.owners[name] = handler_name
+            if name != prog:
+                self.aliases[name] = prog
+            else:
+                self.aliases.pop(name, None)
+        return added
+
+    def remove_handler(self, handler_name: str):
+        """
+        drops every name registered by a handler
+        """
+        for name in [name for name, owner in self.owners.items() if owner == handler_name]:
+            del self.commands[name]
+            del self.owners[name]
+            self.aliases.pop(name, None)
+        self.collisions = [collision for collision in self.collisions if handler_name not in collision[1:]]
+
+    def lookup(self, name: str) -> 'Command':
+        """
+        the command registered under a name or alias, None if there is none
+        """
+        return self.commands.get(name)
+
+    def unique(self) -> Dict[str, 'Command']:
+        """
+        commands by their own name, without aliases
+        """
+        return {name: cmd for name, cmd in self.commands.items() if name not in self.aliases}
@@ -0,0 +1,133 @@
+"""
+feeds a traffic capture back into LibCord, replies go to a sink instead of matterbridge
+
+    python -m libcord.replay capture.jsonl [--config config.yaml] [--speed 1] [--serial] [--out replies.jsonl]
+
+--speed 1 keeps the original pacing, 2 replays twice as fast and 0 as fast as possible,
+replies of two runs over the same capture can be compared with diff
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import logging
+import random
+import sys
+import tempfile
+from typing import List
+import yaml
+
+from .capture import read_capture
+from .metrics import stage_seconds
+
+module_logger = logging.getLogger('libcord.replay')
+
+
+class ReplySink(object):
+    """
+    stands in for the Outbox, keeps every reply instead of posting it
+    """
+    def __init__(self):
+        self.replies: List[dict] = []
+
+    def put(self, payload: dict) -> asyncio.Future:
+        self.replies.append(payload)
+        future = asyncio.get_event_loop().create_future()
+        future.set_result(True)
+        return future
+
+    def depth(self) -> int:
+        return 0
+
+    def stats(self) -> dict:
+        return {'sent': len(self.replies)}
+
+    def ordered(self) -> List[dict]:
+        """
+        replies grouped by gateway, replies of one gateway are in a deterministic order,
+        the interleaving of different gateways is not
+        """
+        return sorted(self.replies, key=lambda reply: reply.get('gateway') or '')
+
+
+async def replay(cord, path: str, speed: float = 1.0) -> dict:
+    """
+    queues every message of the capture on cord.q and waits until all of them are handled
+    """
+    loop = asyncio.get_event_loop()
+    handled = stage_seconds.labels('handle')
+    handled_before = handled.count
+    dropped_before = sum(cord.q.dropped.values())
+    consumer = asyncio.ensure_future(cord.consume_message())
+    start = loop.time()
+    offset = last = 0.0
+    count = 0
+    try:
+        for at, message in read_capture(path):
+            if at < last:
+                # the capture was appended to by another run
+                offset += last
+            last = at
+            if speed:
+                delay = start + (offset + at) / speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await cord.q.put(message)
+            count += 1
+        while handled.count - handled_before + sum(cord.q.dropped.values()) - dropped_before < count:
+            await asyncio.sleep(0.01)
+    finally:
+        consumer.cancel()
+        await asyncio.gather(consumer, return_exceptions=True)
+    return {'messages': count, 'elapsed': loop.time() - start}
+
+
+def main():
+    from libcord import LibCord
+
+    parser = argparse.ArgumentParser(prog='libcord.replay', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('capture')
+    parser.add_argument('--config', default='config.yaml')
+    parser.add_argument('--speed', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=0, help="seed of the random module, for commands like dice")
+    parser.add_argument('--out', help="write the replies to this JSONL file")
+    parser.add_argument('--serial', action='store_true', help="one consumer and one command thread, so random based replies repeat too")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR, stream=sys.stdout, format='[%(asctime)s | %(name)s | %(levelname)s] %(message)s')
+
+    with open(args.config) as f:
+        config = yaml.safe_load(f)
+    config.pop('capture', None)
+    config.pop('metrics', None)
+    # a replay must not mark the messages of the live spool, nor resume them
+    config.pop('spool', None)
+    # captured bursts are replayed faster than they came in, limits would drop replies
+    config.pop('ratelimit', None)
+    # read by main.py for the whole process, not by LibCord
+    config.pop('log_level', None)
+    config.pop('shards', None)
+    parameters = inspect.signature(LibCord).parameters
+    for key in [key for key in config if key not in parameters]:
+        module_logger.warning(f"ignoring config key '{key}'")
+        del config[key]
+    if args.serial:
+        config.update(consumers=1, command_workers=1)
+    # multi-line output goes to a throwaway directory under stable urls
+    config['store'] = {'backend': 'local', 'path': tempfile.mkdtemp(prefix='pycord-replay-'), 'web_url_base': 'replay://output'}
+    cord: LibCord = LibCord(**config)
+    cord.outbox = sink = ReplySink()
+    cord.loader.load_all()
+    random.seed(args.seed)
+
+    loop = asyncio.get_event_loop()
+    result = loop.run_until_complete(replay(cord, args.capture, speed=args.speed))
+    print(f"replayed {result['messages']} messages in {result['elapsed']:.3f}s ({result['messages'] / max(result['elapsed'], 1e-9):.0f}/s), {len(sink.replies)} replies")
+    print(cord.metrics.summary())
+    if args.out:
+        with open(args.out, 'w') as f:
+            for reply in sink.ordered():
+                f.write(json.dumps(reply, separators=(',', ':')) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,440 @@
+"""
+sharded mode: this process reads matterbridge and posts the replies, the messages
+are handled by worker processes, each loading the modules on its own
+
+    ingest process                              worker processes
+    produce_message -> IngestQueue -> distribute --pipe--> consume_message -> commands
+    Outbox <-------------------------------------pipe---- ShardChannel (replies, heartbeats)
+
+messages go to a worker by a hash of their gateway, or of gateway and channel, so the
+replies to one gateway keep their order, workers that exit or stop sending heartbeats
+are restarted, a worker acknowledges every message once it is handled and its replies
+are handed over, the messages a stopped worker had not acknowledged are sent to the
+new one, so a message may be answered twice but is not lost
+"""
+import asyncio
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import copy
+import itertools
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+from time import monotonic, perf_counter
+from typing import Dict, List, Tuple
+from weakref import WeakKeyDictionary
+import zlib
+
+from libcord import LibCord
+from .gitwiki import Gitwiki
+from .message import Message
+from .metrics import metrics, stage_seconds
+
+module_logger = logging.getLogger('libcord.shard')
+
+restarts_total = metrics.counter('libcord_shard_restarts_total', "worker processes restarted", 'reason')
+
+
+class ShardChannel(object):
+    """
+    stands in for the Outbox of a worker, hands replies to the ingest process,
+    which posts them through its Outbox
+    """
+    def __init__(self, conn):
+        self.conn = conn
+        # the auth module and the heartbeat share the pipe with the replies
+        self.lock = threading.Lock()
+        self.sent = 0
+
+    def send(self, item: tuple):
+        with self.lock:
+            self.conn.send(item)
+
+    def put(self, payload: dict) -> asyncio.Future:
+        self.send(('send', payload))
+        self.sent += 1
+        future = asyncio.get_event_loop().create_future()
+        future.set_result(True)
+        return future
+
+    def depth(self) -> int:
+        return 0
+
+    def stats(self) -> dict:
+        return {'sent': self.sent}
+
+
+class ShardAcks(object):
+    """
+    stands in for the spool of a worker, tells the ingest process which messages are
+    handled and their replies handed over, it marks them as done in its own spool
+    """
+    def __init__(self, channel: ShardChannel):
+        self.channel = channel
+        # message -> id the ingest process gave it
+        self.ids: WeakKeyDictionary = WeakKeyDictionary()
+        self.acknowledged = 0
+
+    def append(self, message: Message):
+        pass
+
+    def done(self, message: Message):
+        id = self.ids.pop(message, None)
+        if id is None:
+            return
+        self.channel.send(('done', id))
+        self.acknowledged += 1
+
+    def depth(self) -> int:
+        return len(self.ids)
+
+    def stats(self) -> dict:
+        return {'outstanding': len(self.ids), 'syncs': 0, 'compactions': 0, 'resumed': 0}
+
+
+def setup_logging(level: str):
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    logging.getLogger('libcord').setLevel(level)
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter('[%(asctime)s | %(processName)s | %(name)s | %(levelname)s] %(message)s'))
+    root.addHandler(handler)
+
+
+def run_worker(index: int, config: dict, conn, heartbeat: float, log_level: str):
+    """
+    entry point of a worker process, handles messages from the pipe until it is closed
+    """
+    setup_logging(log_level)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    cord = LibCord(**config)
+    channel = ShardChannel(conn)
+    cord.outbox = channel
+    # LibCord marks a message done once its replies are sent, which here acknowledges it
+    cord.spool = acks = ShardAcks(channel)
+    cord.q.on_drop = acks.done
+    cord.loader.load_all()
+
+    async def deliver(batch: List[Tuple[int, dict]]):
+        for id, message_dict in batch:
+            message = Message.from_dict(message_dict)
+            acks.ids[message] = id
+            await cord.receive(message, source='shard')
+
+    def read():
+        # blocks in recv, so it runs on its own thread and waits for each batch to be queued
+        while True:
+            try:
+                kind, data = conn.recv()
+            except (EOFError, OSError):
+                break
+            if kind == 'stop':
+                break
+            asyncio.run_coroutine_threadsafe(deliver(data), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+
+    async def beat():
+        # sent from the loop, a worker stuck in a command that blocks the loop stops beating
+        while True:
+            channel.send(('alive', None))
+            await asyncio.sleep(heartbeat)
+
+    module_logger.info(f"worker {index} started, pid {os.getpid()}")
+    threading.Thread(target=read, name='libcord-shard-read', daemon=True).start()
+    loop.create_task(cord.consume_message())
+    loop.create_task(beat())
+    if cord.loader.watch:
+        loop.create_task(cord.loader.watch_modules())
+    loop.run_forever()
+    module_logger.info(f"worker {index} stopping")
+
+
+class Shard(object):
+    """
+    one worker process as seen from the ingest process
+    """
+    def __init__(self, index: int, queue_size: int):
+        self.index = index
+        self.pending = asyncio.Queue(queue_size)
+        # taken from pending but not handed to the current process yet, with their ids
+        self.unsent: List[Tuple[int, Message]] = []
+        # handed to the current process and not acknowledged yet
+        self.inflight: 'OrderedDict[int, Message]' = OrderedDict()
+        # taken by a stopped process without being acknowledged, sent first to the next one
+        self.resend: List[Tuple[int, Message]] = []
+        # processes a message was in when they stopped
+        self.attempts = Counter()
+        # set when pending or resend got messages
+        self.arrived = asyncio.Event()
+        # outbox futures of the replies of this worker, acknowledged messages wait for them
+        self.posting: List[asyncio.Future] = []
+        self.process: multiprocessing.Process = None
+        self.conn = None
+        self.connected = asyncio.Event()
+        self.sender = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"libcord-shard{index}")
+        self.started = 0.0
+        self.beat = 0.0
+        self.forwarded = 0
+        self.replies = 0
+        self.restarts = 0
+
+    def stats(self) -> dict:
+        return {
+            'pid': self.process.pid if self.process else None,
+            'alive': bool(self.process and self.process.is_alive()),
+            'pending': self.pending.qsize() + len(self.unsent) + len(self.resend),
+            'inflight': len(self.inflight),
+            'forwarded': self.forwarded,
+            'replies': self.replies,
+            'restarts': self.restarts,
+        }
+
+
+class ShardSupervisor(object):
+    """
+    runs ingest and outbound in this process and the commands in `workers` processes,
+    `key` is gateway or channel, the messages of one key are handled by one worker in order,
+    a worker that has not sent a heartbeat for `timeout` seconds is killed and restarted,
+    a message that was in `retries` + 1 stopped workers is given up
+    """
+    def __init__(self, config: dict, workers: int = None, key: str = 'gateway', heartbeat: float = 1.0, timeout: float = 30.0, restart_delay: float = 1.0, queue_size: int = 100, batch: int = 50, retries: int = 2):
+        if key not in ('gateway', 'channel'):
+            raise ValueError(f"unknown shard key '{key}', choose gateway or channel")
+        self.config = copy.deepcopy(config)
+        self.log_level = self.config.pop('log_level', 'INFO')
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.key = key
+        self.heartbeat = heartbeat
+        self.timeout = timeout
+        self.restart_delay = restart_delay
+        self.queue_size = queue_size
+        self.batch = max(1, batch)
+        self.retries = retries
+        self.ids = itertools.count()
+        # spawn, forking a process with running threads and an event loop is not safe
+        self.context = multiprocessing.get_context('spawn')
+        self.cord = LibCord(**self.config)
+        # the ingest queue tells commands from noise with the regex patterns of the modules,
+        # the commands themselves only ever run in the workers
+        self.cord.loader.load_all()
+        self.shards: List[Shard] = []
+        self.tasks: List[asyncio.Future] = []
+
+    def worker_config(self, index: int) -> dict:
+        """
+        the config of one worker, things only one process can own stay with the ingest process
+        """
+        config = copy.deepcopy(self.config)
+        for key in ('capture', 'metrics', 'spool'):
+            config.pop(key, None)
+        store = config.setdefault('store', {}) or {}
+        # the ingest process serves the local store directory
+        store.pop('serve', None)
+        config['store'] = store
+        if store.get('backend', 'gitwiki') == 'gitwiki':
+            # every worker commits in a clone of its own
+            wiki = dict(config.get('wiki') or {})
+            path = Gitwiki.default_path() if not wiki.get('path') else wiki['path']
+            wiki['path'] = f"{path}-shard{index}"
+            config['wiki'] = wiki
+        return config
+
+    def shard_of(self, message: Message) -> Shard:
+        key = message.gateway or ''
+        if self.key == 'channel':
+            key = f"{key}/{message.channel or ''}"
+        return self.shards[zlib.crc32(key.encode()) % len(self.shards)]
+
+    def spawn(self, shard: Shard):
+        parent_conn, child_conn = self.context.Pipe()
+        process = self.context.Process(
+            target=run_worker, name=f"libcord-shard{shard.index}", daemon=True,
+            args=(shard.index, self.worker_config(shard.index), child_conn, self.heartbeat, self.log_level))
+        process.start()
+        # the child has its own copy, the pipe reports EOF once the child is gone
+        child_conn.close()
+        shard.process, shard.conn = process, parent_conn
+        shard.started = shard.beat = monotonic()
+        loop = asyncio.get_event_loop()
+        threading.Thread(target=self.read, args=(shard, parent_conn, loop), name=f"libcord-shard{shard.index}-read", daemon=True).start()
+        shard.connected.set()
+        module_logger.info(f"started worker {shard.index}, pid {process.pid}")
+
+    def read(self, shard: Shard, conn, loop: asyncio.AbstractEventLoop):
+        """
+        receives replies and heartbeats of one worker process until its pipe closes
+        """
+        while True:
+            try:
+                kind, data = conn.recv()
+            except (EOFError, OSError):
+                return
+            loop.call_soon_threadsafe(self.received, shard, kind, data)
+
+    def received(self, shard: Shard, kind: str, data):
+        shard.beat = monotonic()
+        if kind == 'send':
+            shard.replies += 1
+            future = self.cord.outbox.put(data)
+            if self.cord.spool:
+                shard.posting.append(future)
+        elif kind == 'done':
+            self.acknowledged(shard, data)
+
+    def acknowledged(self, shard: Shard, id: int):
+        """
+        a worker handled a message, it is done in the spool once the replies the worker sent are posted
+        """
+        message = shard.inflight.pop(id, None)
+        shard.attempts.pop(id, None)
+        if message is None or not self.cord.spool:
+            return
+        # the replies came over the pipe ahead of the acknowledgement, those of other messages may wait too
+        shard.posting = [future for future in shard.posting if not future.done()]
+        if not shard.posting:
+            self.cord.spool.done(message)
+            return
+        posted = asyncio.gather(*shard.posting, return_exceptions=True)
+        posted.add_done_callback(lambda f: self.cord.spool.done(message))
+
+    def requeue(self, shard: Shard):
+        """
+        queues the messages a stopped process had not acknowledged for the next one
+        """
+        for id, message in shard.inflight.items():
+            shard.attempts[id] += 1
+            if shard.attempts[id] > self.retries:
+                # most likely the message is what stops the workers
+                module_logger.error(f"giving up {message.gateway} {message.username} '{message.text}', it was in {shard.attempts[id]} stopped workers")
+                del shard.attempts[id]
+                if self.cord.spool:
+                    self.cord.spool.done(message)
+                continue
+            shard.resend.append((id, message))
+        shard.inflight.clear()
+        shard.arrived.set()
+
+    async def distribute(self):
+        """
+        moves messages from the ingest queue to the queue of their shard
+        """
+        while True:
+            message: Message = await self.cord.q.get()
+            start = perf_counter()
+            shard = self.shard_of(message)
+            await shard.pending.put(message)
+            shard.arrived.set()
+            stage_seconds.labels('distribute').observe(perf_counter() - start)
+
+    async def feed(self, shard: Shard):
+        """
+        sends the messages queued for a shard to its process, in batches of what piled up
+        """
+        loop = asyncio.get_event_loop()
+        while True:
+            while not shard.unsent and not shard.resend and shard.pending.empty():
+                shard.arrived.clear()
+                await shard.arrived.wait()
+            if shard.resend:
+                # they are older than anything unsent
+                shard.unsent, shard.resend = shard.resend + shard.unsent, []
+            while len(shard.unsent) < self.batch and not shard.pending.empty():
+                shard.unsent.append((next(self.ids), shard.pending.get_nowait()))
+            await shard.connected.wait()
+            conn = shard.conn
+            batch = shard.unsent
+            try:
+                await loop.run_in_executor(shard.sender, conn.send, ('messages', [(id, message.as_dict()) for id, message in batch]))
+            except (OSError, ValueError) as ex:
+                # the process is gone, the batch waits for the restarted one
+                module_logger.warning(f"worker {shard.index} did not take {len(batch)} messages: {ex}")
+                if shard.conn is conn:
+                    shard.connected.clear()
+                continue
+            if shard.conn is not conn:
+                # restarted while sending, the batch goes to the new process
+                continue
+            shard.forwarded += len(batch)
+            shard.inflight.update(batch)
+            shard.unsent = []
+
+    async def monitor(self):
+        """
+        restarts workers that exited or stopped sending heartbeats
+        """
+        loop = asyncio.get_event_loop()
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            for shard in self.shards:
+                process = shard.process
+                if not process.is_alive():
+                    reason = 'exited'
+                    module_logger.error(f"worker {shard.index} exited with {process.exitcode}")
+                elif monotonic() - shard.beat > self.timeout:
+                    reason = 'unresponsive'
+                    module_logger.error(f"worker {shard.index} sent no heartbeat for {monotonic() - shard.beat:.1f}s, killing it")
+                    process.terminate()
+                    await loop.run_in_executor(None, process.join, 5)
+                    if process.is_alive():
+                        process.kill()
+                        await loop.run_in_executor(None, process.join)
+                else:
+                    continue
+                shard.connected.clear()
+                shard.conn.close()
+                self.requeue(shard)
+                restarts_total.labels(reason).inc()
+                shard.restarts += 1
+                # a worker that crashes on start is not restarted in a tight loop
+                await asyncio.sleep(self.restart_delay)
+                self.spawn(shard)
+
+    def stats(self) -> Dict[int, dict]:
+        return {shard.index: shard.stats() for shard in self.shards}
+
+    def run(self):
+        """
+        starts the workers and ingest on the current event loop, returns the tasks
+        """
+        self.cord.metrics.gauge('libcord_shard_pending', "messages waiting for a worker", lambda: sum(shard.pending.qsize() + len(shard.unsent) + len(shard.resend) for shard in self.shards), self.cord.instance)
+        loop = asyncio.get_event_loop()
+        self.shards = [Shard(index, self.queue_size) for index in range(self.workers)]
+        for shard in self.shards:
+            self.spawn(shard)
+        self.tasks = [
+            loop.create_task(self.cord.produce_message()),
+            loop.create_task(self.distribute()),
+            loop.create_task(self.monitor()),
+            *(loop.create_task(self.feed(shard)) for shard in self.shards),
+        ]
+        if self.cord.loader.watch:
+            # changed regex patterns have to reach the classifier as well
+            self.tasks.append(loop.create_task(self.cord.loader.watch_modules()))
+        return self.tasks
+
+    def stop(self):
+        """
+        cancels ingest and stops the worker processes, messages not handled yet are lost
+        """
+        for task in self.tasks:
+            task.cancel()
+        for shard in self.shards:
+            try:
+                shard.conn.send(('stop', None))
+            except (OSError, ValueError):
+                pass
+        for shard in self.shards:
+            shard.process.join(5)
+            if shard.process.is_alive():
+                shard.process.kill()
+            shard.conn.close()
+            shard.sender.shutdown(wait=False)
+
+    def start(self):
+        module_logger.info(f"starting loop with {self.workers} worker processes")
+        loop = asyncio.get_event_loop()
+        self.run()
+        loop.run_forever()
@@ -0,0 +1,182 @@
+import itertools
+import json
+import logging
+import os
+from pathlib import Path
+import threading
+from time import perf_counter
+from typing import Dict, List
+from weakref import WeakKeyDictionary
+
+from .message import Message
+from .metrics import stage_seconds
+
+module_logger = logging.getLogger('libcord.spool')
+
+
+class MessageSpool(object):
+    """
+    append-only log of the received messages that are not handled yet, so a crash or
+    restart does not lose the backlog, one json line per message or batch of markers:
+
+        {"seq":12,"message":{"text":"...","gateway":"...",...}}
+        {"done":[10,12,11]}
+
+    a background thread writes what was appended within `fsync_interval` seconds,
+    or `max_batch` lines, with a single fsync, a message is only safe once that ran,
+    the log is rewritten with just the outstanding messages once it grows past `compact_size`
+    """
+    def __init__(self, path: str = 'spool', fsync_interval: float = 0.05, max_batch: int = 500, compact_size: int = 1 << 20):
+        self.directory = Path(path)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.path = Path(self.directory, 'messages.log')
+        self.fsync_interval = fsync_interval
+        self.max_batch = max(1, max_batch)
+        self.compact_size = compact_size
+        # seq -> message of everything appended and not done yet, what a compaction keeps
+        self.outstanding: Dict[int, dict] = {}
+        self.seqs: WeakKeyDictionary = WeakKeyDictionary()
+        self.lines: List[str] = []
+        self.done_seqs: List[int] = []
+        self.condition = threading.Condition()
+        self.closed = False
+        self.syncs = 0
+        self.compactions = 0
+        self.file = None
+
+        start = perf_counter()
+        # handed to the ingest queue by LibCord before anything new
+        self.recovered = self.recover()
+        self.resumed = len(self.recovered)
+        next_seq = max(self.outstanding, default=0) + 1
+        self.counter = itertools.count(next_seq)
+        # starts with only the outstanding messages, the old log may end in a torn line
+        self.compact()
+        if self.recovered:
+            module_logger.info(f"resuming {len(self.recovered)} unhandled messages from {self.path} ({perf_counter() - start:.3f}s)")
+        self.writer = threading.Thread(target=self.write_loop, name='libcord-spool', daemon=True)
+        self.writer.start()
+
+    def recover(self) -> List[Message]:
+        """
+        the messages of the log without a done marker, in the order they were received
+        """
+        done = set()
+        try:
+            with open(self.path, 'rb') as f:
+                for number, line in enumerate(f, 1):
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # only the last line can be cut off by a crash
+                        module_logger.warning(f"{self.path}:{number}: skipping invalid line")
+                        continue
+                    if 'done' in entry:
+                        done.update(entry['done'])
+                    else:
+                        self.outstanding[entry['seq']] = entry['message']
+        except FileNotFoundError:
+            return []
+        for seq in done:
+            self.outstanding.pop(seq, None)
+        messages = []
+        for seq in sorted(self.outstanding):
+            message = Message.from_dict(self.outstanding[seq])
+            self.seqs[message] = seq
+            messages.append(message)
+        return messages
+
+    def append(self, message: Message):
+        """
+        adds a message to the log, it is written by the next batch
+        """
+        seq = next(self.counter)
+        data = message.as_dict()
+        line = json.dumps({'seq': seq, 'message': data}, separators=(',', ':')) + '\n'
+        self.seqs[message] = seq
+        with self.condition:
+            self.outstanding[seq] = data
+            self.lines.append(line)
+            if len(self.lines) == 1 or len(self.lines) >= self.max_batch:
+                self.condition.notify()
+
+    def done(self, message: Message):
+        """
+        marks a message as handled, it is not resumed after a restart anymore
+        """
+        seq = self.seqs.pop(message, None)
+        if seq is None:
+            return
+        with self.condition:
+            self.outstanding.pop(seq, None)
+            self.done_seqs.append(seq)
+            if not self.lines and len(self.done_seqs) == 1:
+                self.condition.notify()
+
+    def depth(self) -> int:
+        return len(self.outstanding)
+
+    def write_loop(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.lines or self.done_seqs or self.closed)
+                if not self.closed and len(self.lines) < self.max_batch:
+                    # group commit, everything appended in the meantime shares the fsync
+                    self.condition.wait_for(lambda: len(self.lines) >= self.max_batch or self.closed, timeout=self.fsync_interval)
+                lines, self.lines = self.lines, []
+                done_seqs, self.done_seqs = self.done_seqs, []
+                closed = self.closed
+            if done_seqs:
+                lines.append(json.dumps({'done': done_seqs}, separators=(',', ':')) + '\n')
+            if lines:
+                start = perf_counter()
+                self.file.write(''.join(lines).encode())
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.syncs += 1
+                stage_seconds.labels('spool_fsync').observe(perf_counter() - start)
+                if self.file.tell() > self.compact_size:
+                    self.compact()
+            if closed:
+                self.file.close()
+                return
+
+    def compact(self):
+        """
+        replaces the log by one holding only the outstanding messages
+        """
+        with self.condition:
+            outstanding = dict(self.outstanding)
+        temporary = self.path.with_suffix('.tmp')
+        with open(temporary, 'wb') as f:
+            f.write(''.join(json.dumps({'seq': seq, 'message': data}, separators=(',', ':')) + '\n' for seq, data in sorted(outstanding.items())).encode())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.path)
+        # the rename itself is only durable once the directory is synced
+        directory = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+        if self.file:
+            self.file.close()
+        self.file = open(self.path, 'ab')
+        self.compactions += 1
+
+    def close(self):
+        """
+        writes everything appended so far and stops the writer
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.writer.join()
+
+    def stats(self) -> dict:
+        return {
+            'outstanding': len(self.outstanding),
+            'syncs': self.syncs,
+            'compactions': self.compactions,
+            'resumed': self.resumed,
+        }
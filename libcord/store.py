@@ -0,0 +1,121 @@
+from collections import OrderedDict
+from functools import partial
+import hashlib
+import http.server
+import logging
+from pathlib import Path
+import threading
+
+module_logger = logging.getLogger('libcord.store')
+
+
+class StoreBackend(object):
+    """
+    somewhere to put multi-line output that can be linked to, below web_url_base
+    """
+    web_url_base: str = None
+
+    @staticmethod
+    def file_path(filename: str, is_help: bool, file_extension: str = 'md') -> Path:
+        file_path: Path = Path(f"{filename}.{file_extension}")
+        if is_help:
+            file_path = Path("help" ,file_path)
+        return file_path
+
+    def url_for(self, filename: str, is_help: bool, file_extension: str = 'md') -> str:
+        return self.web_url_base + "/" + "/".join(self.file_path(filename, is_help, file_extension).parts)
+
+    def exists(self, filename: str, is_help: bool, file_extension: str = 'md') -> bool:
+        raise NotImplementedError()
+
+    def upload(self, filename: str, content: str, is_help: bool, file_extension: str = 'md') -> str:
+        """
+        stores the content and returns its url
+        """
+        raise NotImplementedError()
+
+
+class _StoreRequestHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format: str, *args):
+        module_logger.debug(format % args)
+
+
+class LocalStore(StoreBackend):
+    """
+    writes output into a local directory, optionally served over http
+    """
+    def __init__(self, path: str, web_url_base: str = None, serve: int = None, host: str = '127.0.0.1'):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.web_url_base = web_url_base or self.path.resolve().as_uri()
+        self.server = None
+        if serve is not None:
+            handler = partial(_StoreRequestHandler, directory=str(self.path))
+            self.server = http.server.ThreadingHTTPServer((host, serve), handler)
+            if not web_url_base:
+                self.web_url_base = f"http://{host}:{self.server.server_address[1]}"
+            threading.Thread(target=self.server.serve_forever, name='libcord-store', daemon=True).start()
+            module_logger.info(f"serving {self.path} on {self.web_url_base}")
+
+    def exists(self, filename: str, is_help: bool, file_extension: str = 'md') -> bool:
+        return Path(self.path, self.file_path(filename, is_help, file_extension)).exists()
+
+    def upload(self, filename: str, content: str, is_help: bool, file_extension: str = 'md') -> str:
+        full_path = Path(self.path, self.file_path(filename, is_help, file_extension))
+        full_path.parent.mkdir(parents=True, exist_ok=True)
+        # write to a temporary name first, readers never see a partial file
+        tmp_path = full_path.with_name(full_path.name + '.tmp')
+        tmp_path.write_text(content)
+        tmp_path.replace(full_path)
+        return self.url_for(filename, is_help, file_extension)
+
+
+class OutputStore(object):
+    """
+    stores every distinct output once under the hash of its content,
+    repeated outputs are neither written nor committed again, the `max_known`
+    most recently stored keys are remembered, older ones are checked with the backend
+    """
+    def __init__(self, backend: StoreBackend, hash_length: int = 12, max_known: int = 10000):
+        self.backend = backend
+        self.hash_length = hash_length
+        self.max_known = max_known
+        self.known: 'OrderedDict[tuple, None]' = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.writes = 0
+
+    def key(self, cmd: str, content: str) -> str:
+        digest = hashlib.sha256(content.encode()).hexdigest()[:self.hash_length]
+        return f"command/{cmd}/{digest}"
+
+    def put(self, cmd: str, content: str, is_help: bool = False) -> str:
+        """
+        url of the content, stored first if it is not already
+        """
+        filename = self.key(cmd, content)
+        key = (filename, is_help)
+        with self.lock:
+            known = key in self.known
+            if known:
+                self.known.move_to_end(key)
+        if known or self.backend.exists(filename, is_help):
+            self.hits += 1
+            url = self.backend.url_for(filename, is_help)
+        else:
+            self.writes += 1
+            module_logger.debug(f"storing {filename}")
+            url = self.backend.upload(filename, content, is_help)
+        # only once it is stored, a failed upload is tried again by the next put
+        self.remember(key)
+        return url
+
+    def remember(self, key: tuple):
+        with self.lock:
+            self.known[key] = None
+            self.known.move_to_end(key)
+            if len(self.known) > self.max_known:
+                self.known.popitem(last=False)
+
+    def stats(self):
+        return {'known': len(self.known), 'hits': self.hits, 'writes': self.writes}
@@ -0,0 +1,103 @@
+from collections import OrderedDict
+import json
+import logging
+from typing import Callable, Dict, List
+import requests
+import requests.exceptions
+
+from .message import Message
+
+module_logger = logging.getLogger('libcord.stream')
+
+
+class MatterbridgeStream(object):
+    """
+    reads the newline delimited json events of the matterbridge /api/stream endpoint
+    """
+    def __init__(self, reconnect_delay: float = 1.0, reconnect_max: float = 20.0, fallback_after: int = 3, fallback_duration: float = 30.0, connect_timeout: float = 5.0, read_timeout: float = 90.0, dedupe_size: int = 10000):
+        self.dedupe_size = dedupe_size
+        # matterbridge keeps buffering every message for /api/messages while the stream
+        # delivers it, these are skipped by the first poll after falling back
+        self.streamed: 'OrderedDict[tuple, int]' = OrderedDict()
+        self.reconnect_delay = reconnect_delay
+        self.reconnect_max = reconnect_max
+        self.fallback_after = fallback_after
+        self.fallback_duration = fallback_duration
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+    def backoff(self, failures: int) -> float:
+        """
+        delay before the next connection attempt after `failures` failed ones
+        """
+        return min(self.reconnect_delay * 2 ** max(failures - 1, 0), self.reconnect_max)
+
+    @staticmethod
+    def key(message: Message) -> tuple:
+        return (message.timestamp, message.gateway, message.channel, message.username, message.text)
+
+    def delivered(self, message: Message):
+        """
+        remembers a message the stream delivered, the oldest are forgotten past `dedupe_size`
+        """
+        key = self.key(message)
+        self.streamed[key] = self.streamed.get(key, 0) + 1
+        self.streamed.move_to_end(key)
+        if len(self.streamed) > self.dedupe_size:
+            self.streamed.popitem(last=False)
+
+    def unseen(self, messages: List[Message]) -> List[Message]:
+        """
+        the polled messages the stream has not delivered already, a poll empties
+        the matterbridge buffer, so everything remembered is forgotten afterwards
+        """
+        if not self.streamed:
+            return messages
+        unseen = []
+        for message in messages:
+            key = self.key(message)
+            count = self.streamed.get(key)
+            if count:
+                # identical messages are only skipped as often as the stream delivered them
+                self.streamed[key] = count - 1
+            else:
+                unseen.append(message)
+        self.streamed.clear()
+        return unseen
+
+    def parse(self, line: bytes) -> Message:
+        """
+        decodes one line of the stream, None for keepalives and connection events
+        """
+        line = line.strip()
+        if not line:
+            return None
+        message_dict = json.loads(line)
+        if message_dict.get('event') == 'api_connected':
+            return None
+        return Message.from_dict(message_dict)
+
+    def read(self, url: str, headers: Dict[str, str], deliver: Callable[[Message], None]) -> int:
+        """
+        blocking, meant to run in an executor
+
+        raises if the stream could not be opened, returns the number of
+        delivered messages once an established stream ends
+        """
+        count = 0
+        with requests.Session() as session:
+            session.headers.update(headers)
+            response = session.get(url, stream=True, timeout=(self.connect_timeout, self.read_timeout))
+            response.raise_for_status()
+            module_logger.info(f"connected to {url}")
+            try:
+                for line in response.iter_lines():
+                    message = self.parse(line)
+                    if message:
+                        deliver(message)
+                        count += 1
+            except (requests.exceptions.RequestException, ConnectionError) as err:
+                module_logger.warning(f"stream interrupted: {err}")
+            finally:
+                response.close()
+        return count
@@ -0,0 +1,159 @@
+import contextvars
+from contextlib import contextmanager
+import json
+import logging
+import random
+from time import perf_counter
+from typing import List
+from weakref import WeakKeyDictionary
+
+from .message import Message
+
+module_logger = logging.getLogger('libcord.tracing')
+
+_trace: contextvars.ContextVar = contextvars.ContextVar('libcord_trace', default=None)
+
+
+def current_trace() -> 'Trace':
+    """
+    trace of the message handled in the current task, None if it is not sampled
+    """
+    return _trace.get()
+
+
+class Span(object):
+    __slots__ = ('name', 'detail', 'start', 'end')
+
+    def __init__(self, name: str, detail=None, start: float = None, end: float = None):
+        self.name = name
+        self.detail = detail
+        self.start = perf_counter() if start is None else start
+        self.end = end
+
+
+class Trace(object):
+    """
+    the spans of one message from arriving until its last reply is posted,
+    nothing is formatted until the trace is emitted
+    """
+    def __init__(self, tracer: 'Tracer', message: Message):
+        self.tracer = tracer
+        self.message = message
+        self.start = perf_counter()
+        self.end: float = None
+        self.spans: List[Span] = []
+        # the trace itself counts as open until finish()
+        self.open = 1
+
+    def add(self, name: str, start: float, end: float, detail=None) -> Span:
+        span = Span(name, detail, start, end)
+        self.spans.append(span)
+        return span
+
+    def span(self, name: str, detail=None) -> Span:
+        """
+        opens a span that is ended with close(), replies that are still
+        waiting to be posted keep the trace from being emitted
+        """
+        span = Span(name, detail)
+        self.spans.append(span)
+        self.open += 1
+        return span
+
+    def close(self, span: Span):
+        span.end = perf_counter()
+        self.release()
+
+    @contextmanager
+    def timed(self, name: str, detail=None):
+        span = self.span(name, detail)
+        try:
+            yield span
+        finally:
+            self.close(span)
+
+    def finish(self):
+        self.end = perf_counter()
+        self.release()
+
+    def release(self):
+        self.open -= 1
+        if not self.open:
+            self.tracer.emit(self)
+
+    def as_dict(self) -> dict:
+        message = self.message
+        end = max([self.end or self.start] + [span.end for span in self.spans if span.end])
+        return {
+            'gateway': message.gateway,
+            'username': message.username,
+            'text': message.text,
+            'ms': round((end - self.start) * 1000, 3),
+            'spans': [
+                {'name': span.name, 'detail': span.detail, 'offset_ms': round((span.start - self.start) * 1000, 3), 'ms': round((span.end - span.start) * 1000, 3)}
+                for span in self.spans if span.end is not None
+            ],
+        }
+
+    def format(self) -> str:
+        data = self.as_dict()
+        spans = ", ".join(f"{span['name']}{' ' + str(span['detail']) if span['detail'] else ''} {span['ms']:.2f}ms" for span in data['spans'])
+        text = data['text'] or ''
+        if len(text) > 40:
+            text = text[:37] + '...'
+        return f"{data['gateway']}/{data['username']} {text!r} {data['ms']:.2f}ms [{spans}]"
+
+
+class Tracer(object):
+    """
+    traces a random sample of the messages, sample_rate 0 traces none and 1 all,
+    finished traces are logged to the libcord.trace logger as text or json
+    """
+    def __init__(self, sample_rate: float = 0.0, format: str = 'text', seed: int = None):
+        if format not in ('text', 'json'):
+            raise ValueError(f"unknown trace format '{format}'")
+        self.sample_rate = sample_rate
+        self.format = format
+        self.random = random.Random(seed)
+        self.logger = logging.getLogger('libcord.trace')
+        # traces of sampled messages that are waiting in the queue
+        self.pending: WeakKeyDictionary = WeakKeyDictionary()
+        self.sampled = 0
+        self.emitted = 0
+
+    def begin(self, message: Message):
+        """
+        decides whether a message that just arrived is traced
+        """
+        if self.sample_rate and self.random.random() < self.sample_rate:
+            self.pending[message] = Trace(self, message)
+            self.sampled += 1
+
+    def take(self, message: Message) -> Trace:
+        """
+        the trace of a message that is about to be handled, None if it is not sampled
+        """
+        if not self.pending:
+            return None
+        return self.pending.pop(message, None)
+
+    @contextmanager
+    def activate(self, trace: Trace):
+        """
+        makes the trace current_trace() inside the block, and finishes it on exit
+        """
+        token = _trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _trace.reset(token)
+            trace.finish()
+
+    def emit(self, trace: Trace):
+        self.emitted += 1
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        if self.format == 'json':
+            self.logger.info(json.dumps(trace.as_dict()))
+        else:
+            self.logger.info(trace.format())
@@ -0,0 +1,172 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import logging
+from typing import Awaitable, Callable, Dict, List
+import requests
+import requests.adapters
+
+from .message import Message, decode_messages
+from .stream import MatterbridgeStream
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+module_logger = logging.getLogger('libcord.transport')
+
+
+class Transport(object):
+    """
+    http access to the matterbridge api, all methods are coroutines and never block the loop
+    """
+    name = None
+
+    def __init__(self, base_url: str, token: str = None, timeout: float = 10.0, connect_timeout: float = 5.0, pool_size: int = 10):
+        self.base_url = base_url
+        self.headers: Dict[str, str] = {}
+        if token:
+            self.headers['Authorization'] = f"Bearer {token}"
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.pool_size = pool_size
+
+    async def get_messages(self) -> List[Message]:
+        """
+        GET /api/messages
+        """
+        raise NotImplementedError()
+
+    async def post_message(self, payload: dict):
+        """
+        POST /api/message
+        """
+        raise NotImplementedError()
+
+    async def stream(self, stream: MatterbridgeStream, deliver: Callable[[Message], Awaitable[None]]) -> int:
+        """
+        reads GET /api/stream until it ends, same contract as MatterbridgeStream.read,
+        the stream is not read on while `deliver` is waiting
+        """
+        raise NotImplementedError()
+
+    async def close(self):
+        pass
+
+
+class RequestsTransport(Transport):
+    """
+    the blocking requests.Session, with every call moved to a thread pool
+    """
+    name = 'requests'
+
+    def __init__(self, base_url: str, **kwargs):
+        super().__init__(base_url, **kwargs)
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix='libcord-http')
+        # the stream holds its thread for as long as it is connected
+        self.stream_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='libcord-stream')
+
+    def _get_messages(self) -> List[Message]:
+        response = self.session.get(f"{self.base_url}/api/messages", timeout=(self.connect_timeout, self.timeout))
+        response.raise_for_status()
+        return decode_messages(response.content)
+
+    def _post_message(self, payload: dict):
+        response = self.session.post(f"{self.base_url}/api/message", json=payload, timeout=(self.connect_timeout, self.timeout))
+        response.raise_for_status()
+
+    async def get_messages(self) -> List[Message]:
+        return await asyncio.get_event_loop().run_in_executor(self.executor, self._get_messages)
+
+    async def post_message(self, payload: dict):
+        await asyncio.get_event_loop().run_in_executor(self.executor, self._post_message, payload)
+
+    async def stream(self, stream: MatterbridgeStream, deliver: Callable[[Message], Awaitable[None]]) -> int:
+        loop = asyncio.get_event_loop()
+
+        def deliver_threadsafe(message: Message):
+            asyncio.run_coroutine_threadsafe(deliver(message), loop).result()
+
+        return await loop.run_in_executor(self.stream_executor, stream.read, f"{self.base_url}/api/stream", self.headers, deliver_threadsafe)
+
+    async def close(self):
+        self.executor.shutdown(wait=False)
+        self.stream_executor.shutdown(wait=False)
+        self.session.close()
+
+
+class AiohttpTransport(Transport):
+    """
+    asyncio native transport with a keep-alive connection pool
+    """
+    name = 'aiohttp'
+
+    def __init__(self, base_url: str, keepalive_timeout: float = 30.0, **kwargs):
+        super().__init__(base_url, **kwargs)
+        self.keepalive_timeout = keepalive_timeout
+        self.session: 'aiohttp.ClientSession' = None
+
+    def _session(self) -> 'aiohttp.ClientSession':
+        # created lazily, a ClientSession has to be created inside the running loop
+        if not self.session or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=self.keepalive_timeout)
+            timeout = aiohttp.ClientTimeout(total=self.timeout, connect=self.connect_timeout)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=timeout, headers=self.headers)
+        return self.session
+
+    async def get_messages(self) -> List[Message]:
+        async with self._session().get(f"{self.base_url}/api/messages") as response:
+            response.raise_for_status()
+            return decode_messages(await response.read())
+
+    async def post_message(self, payload: dict):
+        async with self._session().post(f"{self.base_url}/api/message", json=payload) as response:
+            response.raise_for_status()
+
+    async def stream(self, stream: MatterbridgeStream, deliver: Callable[[Message], Awaitable[None]]) -> int:
+        count = 0
+        # the stream gets its own session, it would otherwise hold a pooled connection forever
+        timeout = aiohttp.ClientTimeout(total=None, connect=stream.connect_timeout, sock_read=stream.read_timeout)
+        async with aiohttp.ClientSession(timeout=timeout, headers=self.headers) as session:
+            async with session.get(f"{self.base_url}/api/stream") as response:
+                response.raise_for_status()
+                module_logger.info(f"connected to {self.base_url}/api/stream")
+                try:
+                    async for line in response.content:
+                        message = stream.parse(line)
+                        if message:
+                            await deliver(message)
+                            count += 1
+                except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+                    module_logger.warning(f"stream interrupted: {err!r}")
+        return count
+
+    async def close(self):
+        if self.session:
+            await self.session.close()
+
+
+transports = {
+    RequestsTransport.name: RequestsTransport,
+    AiohttpTransport.name: AiohttpTransport,
+}
+
+
+def create_transport(base_url: str, transport: str = None, **kwargs) -> Transport:
+    """
+    creates the named transport, aiohttp if available when no name is given
+    """
+    if not transport:
+        transport = AiohttpTransport.name if aiohttp else RequestsTransport.name
+    if transport not in transports:
+        raise ValueError(f"unknown transport '{transport}', choose one of {list(transports)}")
+    if transport == AiohttpTransport.name and not aiohttp:
+        module_logger.warning("aiohttp is not installed, falling back to requests")
+        transport = RequestsTransport.name
+    module_logger.debug(f"using {transport} transport")
+    return transports[transport](base_url, **kwargs)
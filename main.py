@@ -7,34 +7,44 @@ import yaml
 
 from libcord import LibCord
 
-root = logging.getLogger()
-root.setLevel(logging.INFO)
-logging.getLogger('libcord').setLevel(logging.DEBUG)
-
-ch = logging.StreamHandler(sys.stdout)
-ch.setLevel(logging.DEBUG)
-formatter = logging.Formatter('[%(asctime)s | %(name)s | %(levelname)s] %(message)s')
-ch.setFormatter(formatter)
-root.addHandler(ch)
-
-config = None
-with open('config.yaml') as f: 
-    config = yaml.load(f)
-
-cord: LibCord = LibCord(**config)
-
-# test wrapper method
-
-def test(cmd: str) -> str:
-    print(f"calling `{cmd}`")
-    result = cord.call(cmd=cmd)
-    print(f"result `{result}`")
-    return result
-
-# test(cmd="test saf fd<fd ewre")
-# test(cmd='test2 "printed 2 times" 2 4')
-# test(cmd='test2 "printed 2 times"" asdsd 4')
-# test(cmd="test2 -h")
-# test(cmd="test2 1 1")
-
-cord.start()
+# worker processes of the sharded mode import this file again, only the main process starts
+if __name__ == '__main__':
+    config = None
+    with open('config.yaml') as f:
+        config = yaml.safe_load(f)
+
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    # DEBUG logs every message and command call, only meant for development
+    log_level = config.pop('log_level', 'INFO')
+    logging.getLogger('libcord').setLevel(log_level)
+
+    ch = logging.StreamHandler(sys.stdout)
+    ch.setLevel(logging.DEBUG)
+    formatter = logging.Formatter('[%(asctime)s | %(name)s | %(levelname)s] %(message)s')
+    ch.setFormatter(formatter)
+    root.addHandler(ch)
+
+    shards = config.pop('shards', None)
+    if shards and shards.get('workers') != 0:
+        from libcord.shard import ShardSupervisor
+        ShardSupervisor({**config, 'log_level': log_level}, **shards).start()
+        sys.exit()
+
+    cord: LibCord = LibCord(**config)
+
+    # test wrapper method
+
+    def test(cmd: str) -> str:
+        print(f"calling `{cmd}`")
+        result = cord.call(cmd=cmd)
+        print(f"result `{result}`")
+        return result
+
+    # test(cmd="test saf fd<fd ewre")
+    # test(cmd='test2 "printed 2 times" 2 4')
+    # test(cmd='test2 "printed 2 times"" asdsd 4')
+    # test(cmd="test2 -h")
+    # test(cmd="test2 1 1")
+
+    cord.start()
@@ -0,0 +1,103 @@
+import sys
+import tempfile
+from pathlib import Path
+
+import libcord.cache
+import libcord.modules
+from libcord import LibCord
+from libcord.authenticator import AuthUser
+from libcord.cache import ResultCache, _missing
+
+
+def create_cord(**extra) -> LibCord:
+    return LibCord(username='bot', store={'backend': 'local', 'path': tempfile.mkdtemp()}, modules={'load': []}, **extra)
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(libcord.cache, 'monotonic', lambda: now[0])
+    cache = ResultCache(ttl=10)
+    cache.put('key', 'value')
+    now[0] += 9.9
+    assert cache.get('key') == 'value'
+    now[0] += 0.2
+    assert cache.get('key') is _missing
+    assert cache.stats()['size'] == 0
+
+
+def test_least_recently_used_is_evicted():
+    cache = ResultCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    assert cache.get('b') is _missing
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.evictions == 1
+
+
+def test_unhashable_arguments_are_not_cached():
+    assert ResultCache.key({'values': [1, 2]}) == ResultCache.key({'values': (1, 2)})
+    assert ResultCache.key({'options': {'a': 1}}) is None
+    assert ResultCache.key({'values': [[1], [2]]}) is None
+
+
+def test_cached_command_runs_once_per_arguments():
+    cord = create_cord()
+    handler = cord.create_handler('cached')
+    calls = []
+
+    @handler.register('square')
+    @handler.cache(maxsize=8)
+    def square(n: int):
+        calls.append(n)
+        print(n * n)
+
+    assert [cord.call(f"square {n}").output for n in (3, 3, 4)] == ['9', '9', '16']
+    assert calls == [3, 4]
+    assert cord.cache_stats()['square']['hits'] == 1
+
+
+def test_per_user_results_are_kept_apart():
+    cord = create_cord()
+    handler = cord.create_handler('cached')
+
+    @handler.register('whoami')
+    @handler.cache(per_user=True)
+    def whoami(user: AuthUser):
+        print(user.username)
+
+    alice, bob = AuthUser('alice', 'irc', 1), AuthUser('bob', 'irc', 2)
+    assert [cord.call('whoami', user=user).output for user in (alice, bob, alice)] == ['alice', 'bob', 'alice']
+    assert cord.cache_stats()['whoami']['hits'] == 1
+
+
+cached_module = """
+def init(cord):
+    test = cord.create_handler('test')
+
+    @test.register('square')
+    @test.cache()
+    def square(n: int):
+        print(n * n)
+"""
+
+
+def test_reload_drops_the_cached_results(monkeypatch):
+    cord = LibCord(username='bot', store={'backend': 'local', 'path': tempfile.mkdtemp()}, modules={'load': ['test']})
+    cord.loader.load_all()
+    name = 'libcord.modules.test'
+    monkeypatch.setitem(sys.modules, name, sys.modules[name])
+    monkeypatch.setattr(libcord.modules, 'test', sys.modules[name])
+    source = Path(tempfile.mkdtemp(), 'test.py')
+    source.write_text(cached_module)
+    cord.loader.module_file = lambda module: source
+
+    cord.loader.reload('test')
+    cord.call('square 3')
+    previous = cord.lookup('square').cache
+    assert previous.stats()['size'] == 1
+    cord.loader.reload('test')
+    assert previous.stats()['size'] == 0
+    assert cord.lookup('square').cache is not previous
+    assert cord.cache_stats()['square']['size'] == 0
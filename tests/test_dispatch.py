@@ -0,0 +1,31 @@
+import re
+
+from libcord.dispatch import RegexDispatcher, RegexEntry
+
+
+class Cmd(object):
+    def __init__(self, pattern: str):
+        self.pattern = re.compile(pattern)
+
+
+def dispatch(pattern: str, text: str) -> bool:
+    return bool(RegexDispatcher([('cmd', Cmd(pattern))]).candidates(text))
+
+
+def test_scoped_flags_are_not_taken_as_literals():
+    assert dispatch(r'(?i:hello) world', 'HELLO world')
+    assert dispatch(r'x(?i:AB)y', 'xaby')
+    assert not dispatch(r'x(?i:AB)y', 'xabz')
+
+
+def test_plain_groups_still_give_literals():
+    entry = RegexEntry('cmd', None, re.compile(r'(hello) (?P<name>\w+)'))
+    assert entry.prefix == 'hello '
+
+
+def test_group_references_are_not_combined():
+    for pattern in (r'(a)?(?(1)b|c)', r'(?P<x>a)(?P=x)', r'(a)\1'):
+        assert not RegexEntry('cmd', None, re.compile(pattern)).combinable()
+    assert RegexEntry('cmd', None, re.compile(r'(a)b')).combinable()
+    assert dispatch(r'(a)?(?(1)b|c)', 'ab')
+    assert dispatch(r'(a)?(?(1)b|c)', 'c')
@@ -0,0 +1,110 @@
+import asyncio
+import tempfile
+import time
+
+import pytest
+
+from libcord import LibCord
+from libcord.execution import CommandTimeout
+
+
+def test_cancel_is_not_swallowed_by_except_exception():
+    cord = LibCord(username='bot', command_workers=1, store={'backend': 'local', 'path': tempfile.mkdtemp()}, modules={'load': []})
+    handler = cord.create_handler('stubborn')
+
+    @handler.register('retry')
+    def retry():
+        while True:
+            try:
+                time.sleep(0.01)
+            except Exception:
+                pass
+
+    @handler.register('quick')
+    def quick():
+        print('done')
+
+    async def run():
+        with pytest.raises(CommandTimeout):
+            await cord.call_async('retry', timeout=0.3)
+        return await cord.call_async('quick', timeout=1.0)
+
+    assert asyncio.run(run()).output == 'done'
+
+
+# what the hang command saw of its cancellation
+hung = []
+
+
+def async_cord() -> LibCord:
+    cord = LibCord(username='bot', store={'backend': 'local', 'path': tempfile.mkdtemp()}, modules={'load': []})
+    # registered like ModLoader does, which also builds the regex dispatcher
+    with cord.stage_commands():
+        handler = cord.create_handler('async')
+
+        @handler.register('double')
+        async def double(n: int):
+            await asyncio.sleep(0)
+            print('doubling')
+            return str(n * 2)
+
+        @handler.register('count')
+        async def count(n: int):
+            for i in range(n, 0, -1):
+                yield str(i)
+
+        @handler.register('hang')
+        async def hang():
+            try:
+                await asyncio.sleep(10)
+            finally:
+                hung.append('cancelled')
+
+        @handler.register('first')
+        @handler.regex(r'ping')
+        def first():
+            time.sleep(0.05)
+            print('first')
+
+        @handler.register('second')
+        @handler.regex(r'p\w+')
+        async def second():
+            return 'second'
+
+        @handler.register('third')
+        @handler.regex(r'\w+ng')
+        def third():
+            print('third')
+
+    return cord
+
+
+def test_async_command_output():
+    cord = async_cord()
+
+    async def run():
+        return await cord.call_async('double 21', timeout=1.0), await cord.call_async('count 3', timeout=1.0)
+
+    double, count = asyncio.run(run())
+    assert (double.output, double.cmd) == ('doubling\n42', 'double')
+    assert count.output == '3\n2\n1'
+
+
+def test_async_command_is_cancelled_on_timeout():
+    cord = async_cord()
+    hung.clear()
+    with pytest.raises(CommandTimeout):
+        asyncio.run(cord.call_async('hang', timeout=0.2))
+    assert hung == ['cancelled']
+
+
+def test_async_command_called_without_a_loop():
+    # the blocking entry point, as used from the command pool
+    assert async_cord().call('double 4').output == 'doubling\n8'
+
+
+def test_regex_results_keep_candidate_order():
+    cord = async_cord()
+    results = asyncio.run(cord.call_regex_async('ping', timeout=1.0))
+    assert [(result.cmd, result.output) for result in results] == [('first', 'first'), ('second', 'second'), ('third', 'third')]
+    assert [result.cmd for result in cord.call_regex('ping')] == ['first', 'second', 'third']
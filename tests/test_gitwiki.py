@@ -0,0 +1,27 @@
+from pathlib import Path
+
+import git
+import pytest
+
+from libcord.gitwiki import Gitwiki
+
+
+def test_offline_wiki_with_relative_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    wiki = Gitwiki(path='wiki', offline=True)
+    assert wiki.web_url_base == Path(tmp_path, 'wiki').as_uri()
+
+
+def test_commit_whose_push_failed_is_pushed_by_the_retry(tmp_path):
+    wiki = Gitwiki(path=str(tmp_path / 'wiki'), offline=True)
+    wiki.prepare()
+    hook = Path(tmp_path, 'wiki.git', 'hooks', 'pre-receive')
+    hook.parent.mkdir(exist_ok=True)
+    hook.write_text("#!/bin/sh\nexit 1\n")
+    hook.chmod(0o755)
+    with pytest.raises(git.GitCommandError):
+        wiki.write({Path('a.md'): 'a'})
+    hook.unlink()
+    # the same content again, nothing new to commit
+    wiki.write({Path('a.md'): 'a'})
+    assert git.Repo(tmp_path / 'wiki.git').head.commit.message == 'added a'
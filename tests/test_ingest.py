@@ -0,0 +1,49 @@
+import asyncio
+
+from libcord.ingest import IngestQueue
+from libcord.message import Message
+
+
+def lane_of(message: Message) -> int:
+    return int(message.gateway[-1])
+
+
+def test_full_lane_does_not_hold_up_other_lanes():
+    async def run():
+        q = IngestQueue(lambda message: True, maxsize=100, lanes=2, lane_of=lane_of)
+        for i in range(10):
+            await q.put(Message(text=f"slow {i}", gateway='g0'))
+        await q.put(Message(text='fast', gateway='g1'))
+        # nothing takes from lane 0, lane 1 still gets its message right away
+        return await asyncio.wait_for(q.get(1), 0.1)
+
+    assert asyncio.run(run()).text == 'fast'
+
+
+def test_drop_noise_classifies_each_message_once():
+    calls = []
+
+    def is_command(message: Message) -> bool:
+        calls.append(message.text)
+        return message.text.startswith('.')
+
+    async def run():
+        q = IngestQueue(is_command, maxsize=3, policy='drop_noise', lanes=2, lane_of=lane_of)
+        for text in ('.a', 'noise', '.b', '.c', '.d'):
+            await q.put(Message(text=text, gateway='g0'))
+        return [(await q.get()).text for _ in range(q.qsize())], q.stats()
+
+    texts, stats = asyncio.run(run())
+    assert texts == ['.b', '.c', '.d']
+    assert stats['dropped'] == {'noise': 1, 'oldest': 1}
+    assert calls == ['.a', 'noise', '.b', '.c', '.d']
+
+
+def test_get_without_lane_takes_the_oldest():
+    async def run():
+        q = IngestQueue(lambda message: True, lanes=2, lane_of=lane_of)
+        for text, gateway in (('1', 'g1'), ('2', 'g0'), ('3', 'g1')):
+            await q.put(Message(text=text, gateway=gateway))
+        return [(await q.get()).text for _ in range(3)]
+
+    assert asyncio.run(run()) == ['1', '2', '3']
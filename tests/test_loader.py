@@ -0,0 +1,52 @@
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+import libcord.modules
+from libcord import LibCord
+
+broken = """
+MARKER = 'new'
+
+def init(cord):
+    raise RuntimeError('broken')
+"""
+
+fixed = """
+def init(cord):
+    test = cord.create_handler('test')
+
+    @test.register('fresh')
+    def fresh():
+        print('fresh')
+"""
+
+
+def test_failed_reload_leaves_the_module_alone(monkeypatch):
+    cord = LibCord(username='bot', store={'backend': 'local', 'path': tempfile.mkdtemp()}, modules={'load': ['test']})
+    cord.loader.load_all()
+    name = 'libcord.modules.test'
+    monkeypatch.setitem(sys.modules, name, sys.modules[name])
+    monkeypatch.setattr(libcord.modules, 'test', sys.modules[name])
+    previous = sys.modules[name]
+    source = Path(tempfile.mkdtemp(), 'test.py')
+    cord.loader.module_file = lambda module: source
+
+    source.write_text(broken)
+    with pytest.raises(RuntimeError):
+        cord.loader.reload('test')
+    assert sys.modules[name] is previous and not hasattr(previous, 'MARKER')
+    assert cord.lookup('dice') is not None
+
+    source.write_text(fixed)
+    cord.loader.reload('test')
+    assert sys.modules[name] is not previous
+    assert cord.lookup('fresh') is not None
+
+
+def test_reload_refuses_modules_that_are_not_enabled():
+    cord = LibCord(username='bot', store={'backend': 'local', 'path': tempfile.mkdtemp()}, modules={'load': ['core']})
+    with pytest.raises(ValueError):
+        cord.loader.reload('test')
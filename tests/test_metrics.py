@@ -0,0 +1,25 @@
+import tempfile
+
+from libcord import LibCord
+from libcord.metrics import Metrics
+
+
+def test_gauges_of_two_instances_are_kept_apart():
+    first = LibCord(username='bot', store={'backend': 'local', 'path': tempfile.mkdtemp()}, modules={'load': []})
+    second = LibCord(username='bot', store={'backend': 'local', 'path': tempfile.mkdtemp()}, modules={'load': []})
+    first.q.size = 3
+    text = first.metrics.render_prometheus()
+    assert f'libcord_queue_depth{{instance="{first.instance}"}} 3' in text
+    assert f'libcord_queue_depth{{instance="{second.instance}"}} 0' in text
+
+
+def test_render_labels_and_buckets():
+    registry = Metrics()
+    registry.counter('hits_total', "hits", 'path').labels('/a').inc(2)
+    registry.histogram('wait_seconds', "waits").labels().observe(0.003)
+    registry.gauge('depth', "depth", lambda: 1)
+    text = registry.render_prometheus()
+    assert 'hits_total{path="/a"} 2' in text
+    assert 'wait_seconds_bucket{le="0.005"} 1' in text
+    assert 'wait_seconds_count 1' in text
+    assert '\ndepth 1\n' in text
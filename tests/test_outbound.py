@@ -0,0 +1,28 @@
+import asyncio
+
+from libcord.outbound import Outbox
+
+
+class RecordingTransport(object):
+    def __init__(self):
+        self.posted = []
+
+    async def post_message(self, payload: dict):
+        self.posted.append(payload)
+
+
+def test_attachment_only_reply_is_coalesced():
+    transport = RecordingTransport()
+
+    async def run():
+        outbox = Outbox(transport, rate=0)
+        futures = [
+            outbox.put({'gateway': 'test', 'text': 'first'}),
+            outbox.put({'gateway': 'test'}),
+            outbox.put({'gateway': 'test', 'text': 'last'}),
+        ]
+        return await asyncio.gather(*futures), outbox.coalesced
+
+    posted, coalesced = asyncio.run(run())
+    assert posted == [True, True, True] and coalesced == 2
+    assert transport.posted == [{'gateway': 'test', 'text': 'first\n\nlast'}]
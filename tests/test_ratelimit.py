@@ -0,0 +1,33 @@
+import asyncio
+import os
+import tempfile
+
+from libcord import LibCord
+from libcord.message import Message
+from libcord.ratelimit import RateLimiter
+
+
+def test_duplicates_are_collapsed_per_user():
+    limiter = RateLimiter()
+    assert limiter.allow('irc/alice', 'test', '.roll') is None
+    assert limiter.allow('irc/bob', 'test', '.roll') is None
+    assert limiter.allow('irc/alice', 'test', '.roll') == 'duplicate'
+
+
+def test_lazy_command_gets_its_class_limit():
+    manifest = os.path.join(tempfile.mkdtemp(), 'manifest.yaml')
+    with open(manifest, 'w') as f:
+        f.write("test:\n  commands: [m]\n  regex: false\n")
+    cord = LibCord(username='bot', store={'backend': 'local', 'path': tempfile.mkdtemp()},
+                   modules={'load': ['test'], 'lazy': True, 'manifest': manifest},
+                   ratelimit={'classes': {'expensive': {'rate': 0.01, 'burst': 1}}})
+    cord.loader.load_all()
+    assert 'm' in cord.loader.pending
+
+    async def run():
+        cord.outbox.put = lambda payload: asyncio.get_event_loop().create_future()
+        for i in (1, 2):
+            await cord.handle_message(Message.from_dict({'text': f".m {i}", 'username': 'user', 'gateway': 'test'}))
+
+    asyncio.run(run())
+    assert cord.limiter.limited == {'rate': 1}
@@ -0,0 +1,76 @@
+import tempfile
+
+import pytest
+
+from libcord import LibCord
+from libcord.registry import CommandRegistry
+
+
+def create_cord() -> LibCord:
+    return LibCord(username='bot', store={'backend': 'local', 'path': tempfile.mkdtemp()}, modules={'load': []})
+
+
+def test_aliases_resolve_to_their_command():
+    registry = CommandRegistry()
+    cmd = object()
+    registry.add('search', 'g', cmd, aliases=['google', 'find'])
+    assert registry.lookup('g') is cmd and registry.lookup('google') is cmd and registry.lookup('find') is cmd
+    assert registry.unique() == {'g': cmd}
+    assert registry.lookup('bing') is None
+
+
+def test_registering_again_replaces_the_aliases():
+    registry = CommandRegistry()
+    old, new = object(), object()
+    registry.add('search', 'g', old, aliases=['google', 'find'])
+    registry.add('search', 'g', new, aliases=['google'])
+    assert registry.lookup('g') is new and registry.lookup('google') is new
+    assert registry.lookup('find') is None
+    assert registry.aliases == {'google': 'g'}
+
+
+def test_collisions_keep_the_first_handler():
+    registry = CommandRegistry()
+    first, second = object(), object()
+    registry.add('one', 'x', first, aliases=['y'])
+    assert not registry.add('two', 'z', second, aliases=['x'])
+    assert registry.lookup('x') is first and registry.lookup('z') is second
+    assert registry.collisions == [('x', 'two', 'one')]
+    registry.remove_handler('two')
+    assert registry.collisions == [] and registry.lookup('z') is None
+    assert registry.lookup('y') is first
+
+
+def test_stage_commands_swaps_all_or_nothing():
+    cord = create_cord()
+    with cord.stage_commands():
+        handler = cord.create_handler('staged')
+
+        @handler.register('old', aliases=['o'])
+        def old():
+            print('old')
+
+    registry = cord.registry
+    with pytest.raises(RuntimeError):
+        with cord.stage_commands():
+            handler = cord.create_handler('staged')
+
+            @handler.register('new')
+            def new():
+                print('new')
+
+            # not visible before the block ends
+            assert cord.lookup('new') is None
+            raise RuntimeError('init failed')
+    assert cord.registry is registry
+    assert cord.call('o').output == 'old' and cord.lookup('new') is None
+
+    with cord.stage_commands():
+        handler = cord.create_handler('staged')
+
+        @handler.register('new')
+        def new():
+            print('new')
+
+    assert cord.call('new').output == 'new'
+    assert cord.lookup('old') is None and cord.lookup('o') is None
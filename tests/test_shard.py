@@ -0,0 +1,112 @@
+import asyncio
+import os
+import signal
+import tempfile
+import time
+
+from libcord.fakebridge import FakeMatterbridge
+from libcord.message import Message
+from libcord.shard import ShardSupervisor
+
+
+def config(**extra) -> dict:
+    return {'username': 'bot', 'store': {'backend': 'local', 'path': tempfile.mkdtemp()}, 'modules': {'load': ['test']}, **extra}
+
+
+def test_drop_noise_keeps_regex_commands():
+    supervisor = ShardSupervisor(config(queue={'maxsize': 2, 'policy': 'drop_noise'}), workers=1)
+    queue = supervisor.cord.q
+
+    async def run():
+        for text in ('hello', '3dd6', 'again', '2dd4'):
+            await queue.put(Message.from_dict({'text': text, 'username': 'user', 'gateway': 'test'}))
+        return [(await queue.get()).text for _ in range(queue.qsize())]
+
+    assert asyncio.run(run()) == ['3dd6', '2dd4']
+    assert queue.dropped == {'noise': 2}
+
+
+def run_until(loop, condition, timeout: float = 20.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        loop.run_until_complete(asyncio.sleep(0.05))
+    return condition()
+
+
+def start_supervisor(bridge: FakeMatterbridge, workers: int = 1, timeout: float = 10, **extra) -> (asyncio.AbstractEventLoop, ShardSupervisor):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    settings = config(host=bridge.host, port=bridge.port, ingest='stream', http={'transport': 'aiohttp'}, outbound={'rate': 0, 'coalesce': False}, log_level='ERROR', **extra)
+    supervisor = ShardSupervisor(settings, workers=workers, heartbeat=0.2, timeout=timeout, restart_delay=0.1)
+    supervisor.run()
+    assert run_until(loop, lambda: all(shard.beat > shard.started for shard in supervisor.shards))
+    return loop, supervisor
+
+
+def stop_supervisor(loop: asyncio.AbstractEventLoop, supervisor: ShardSupervisor):
+    supervisor.stop()
+    loop.run_until_complete(asyncio.gather(*supervisor.tasks, return_exceptions=True))
+    loop.run_until_complete(supervisor.cord.transport.close())
+    if supervisor.cord.spool:
+        supervisor.cord.spool.close()
+    loop.close()
+
+
+def test_message_of_a_killed_worker_is_answered_by_the_next_one():
+    with FakeMatterbridge() as bridge:
+        loop, supervisor = start_supervisor(bridge, spool={'path': tempfile.mkdtemp()})
+        shard = supervisor.shards[0]
+        spool = supervisor.cord.spool
+        try:
+            bridge.inject('.sleep 1')
+            assert run_until(loop, lambda: shard.inflight)
+            first = shard.process.pid
+            os.kill(first, signal.SIGKILL)
+            assert run_until(loop, lambda: bridge.sent)
+            assert shard.restarts == 1 and shard.process.pid != first
+            assert bridge.sent[0]['text'] == 'slept 1.0s'
+            assert run_until(loop, lambda: not spool.depth())
+            assert not shard.inflight
+        finally:
+            stop_supervisor(loop, supervisor)
+
+
+def test_killed_worker_is_restarted_and_answers_later_messages():
+    with FakeMatterbridge() as bridge:
+        loop, supervisor = start_supervisor(bridge, workers=2)
+        try:
+            shard = supervisor.shard_of(Message.from_dict({'text': '', 'gateway': 'test'}))
+            os.kill(shard.process.pid, signal.SIGKILL)
+            # sent while the worker is gone, it waits for the restarted one
+            for i in range(3):
+                bridge.inject(f".d {i}", gateway='test')
+            assert run_until(loop, lambda: len(bridge.sent) == 3)
+            assert shard.restarts == 1
+            assert [reply['text'].split(',')[0] for reply in bridge.sent] == [f"testing defaults = number: {i}" for i in range(3)]
+        finally:
+            stop_supervisor(loop, supervisor)
+
+
+def test_worker_without_heartbeat_is_killed_and_restarted():
+    with FakeMatterbridge() as bridge:
+        # long enough for a worker to start up on a busy machine
+        loop, supervisor = start_supervisor(bridge, timeout=3)
+        shard = supervisor.shards[0]
+        try:
+            stopped = shard.process.pid
+            os.kill(stopped, signal.SIGSTOP)
+            assert run_until(loop, lambda: shard.process.pid != stopped)
+            assert shard.restarts == 1
+            bridge.inject('.d 7')
+            assert run_until(loop, lambda: bridge.sent)
+            assert bridge.sent[0]['text'].startswith("testing defaults = number: 7")
+        finally:
+            stop_supervisor(loop, supervisor)
+
+
+def test_worker_config_keeps_process_wide_things_in_the_ingest_process():
+    supervisor = ShardSupervisor(config(capture={'path': os.path.join(tempfile.mkdtemp(), 'capture.jsonl')}, metrics={'port': None}, spool={'path': tempfile.mkdtemp()}, store={'backend': 'gitwiki'}, wiki={'path': '/tmp/wiki'}), workers=2)
+    worker = supervisor.worker_config(1)
+    assert not {'capture', 'metrics', 'spool'} & set(worker)
+    assert worker['wiki']['path'] == '/tmp/wiki-shard1'
+    supervisor.cord.spool.close()
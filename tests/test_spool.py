@@ -0,0 +1,42 @@
+import asyncio
+import tempfile
+
+from libcord import LibCord
+from libcord.message import Message
+
+
+class HeldOutbox(object):
+    """
+    an outbox that posts nothing until the test resolves its futures
+    """
+    def __init__(self):
+        self.futures = []
+
+    def put(self, payload: dict) -> asyncio.Future:
+        future = asyncio.get_event_loop().create_future()
+        self.futures.append(future)
+        return future
+
+
+def test_message_stays_spooled_until_its_reply_is_posted():
+    cord = LibCord(username='bot', store={'backend': 'local', 'path': tempfile.mkdtemp()}, modules={'load': []}, spool={'path': tempfile.mkdtemp()})
+    handler = cord.create_handler('echo')
+
+    @handler.register('echo')
+    def echo():
+        print('echo')
+
+    async def run():
+        outbox = cord.outbox = HeldOutbox()
+        consuming = asyncio.ensure_future(cord.consume_message())
+        await cord.receive(Message.from_dict({'text': '.echo', 'username': 'user', 'gateway': 'test'}))
+        while not outbox.futures:
+            await asyncio.sleep(0.01)
+        handled = cord.spool.depth()
+        outbox.futures[0].set_result(True)
+        await asyncio.sleep(0.01)
+        consuming.cancel()
+        return handled, cord.spool.depth()
+
+    assert asyncio.run(run()) == (1, 0)
+    cord.spool.close()
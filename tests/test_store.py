@@ -0,0 +1,30 @@
+import pytest
+
+from libcord.store import LocalStore, OutputStore
+
+
+class FlakyStore(LocalStore):
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.failures = 1
+
+    def upload(self, filename: str, content: str, is_help: bool, file_extension: str = 'md') -> str:
+        if self.failures:
+            self.failures -= 1
+            raise OSError('disk full')
+        return super().upload(filename, content, is_help, file_extension)
+
+
+def test_failed_upload_is_tried_again(tmp_path):
+    store = OutputStore(FlakyStore(str(tmp_path)))
+    with pytest.raises(OSError):
+        store.put('cmd', 'a\nb')
+    store.put('cmd', 'a\nb')
+    assert store.writes == 2 and store.backend.exists(store.key('cmd', 'a\nb'), False)
+
+
+def test_known_keeps_the_most_recent(tmp_path):
+    store = OutputStore(LocalStore(str(tmp_path)), max_known=2)
+    for content in ('a', 'b', 'a', 'c'):
+        store.put('cmd', content)
+    assert [filename for filename, is_help in store.known] == [store.key('cmd', 'a'), store.key('cmd', 'c')]
@@ -0,0 +1,36 @@
+import asyncio
+import tempfile
+
+from libcord import LibCord
+from libcord.fakebridge import FakeMatterbridge
+
+
+def test_fallback_poll_skips_what_the_stream_delivered():
+    with FakeMatterbridge() as bridge:
+        cord = LibCord(username='bot', host=bridge.host, port=bridge.port, ingest='stream', http={'transport': 'aiohttp'},
+                       store={'backend': 'local', 'path': tempfile.mkdtemp()}, modules={'load': []})
+
+        async def run():
+            streaming = asyncio.ensure_future(cord.stream_message())
+            await asyncio.sleep(0.5)
+            for i in range(3):
+                bridge.inject(f".d {i}")
+            await asyncio.sleep(0.5)
+            streaming.cancel()
+            await asyncio.gather(streaming, return_exceptions=True)
+            # the stream failed, the fallback polls the buffer that still holds all 3
+            bridge.inject(".d 3")
+            await cord.poll_message(duration=0.3)
+            await cord.transport.close()
+            return [(await cord.q.get()).text for _ in range(cord.q.qsize())]
+
+        assert asyncio.run(run()) == ['.d 0', '.d 1', '.d 2', '.d 3']
+
+
+def test_identical_messages_are_only_skipped_as_often_as_streamed():
+    with FakeMatterbridge() as bridge:
+        cord = LibCord(username='bot', host=bridge.host, port=bridge.port, store={'backend': 'local', 'path': tempfile.mkdtemp()}, modules={'load': []})
+        messages = [cord.stream.parse(b'{"text": ".d 1", "gateway": "test"}') for _ in range(3)]
+        cord.stream.delivered(messages[0])
+        assert len(cord.stream.unseen(messages)) == 2
+        assert not cord.stream.streamed